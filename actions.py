@@ -1,48 +1,236 @@
 import os
 import sys
+import copy
+import time
 import asyncio
-import random
 from typing import List
 from metagpt.actions import Action
 from metagpt.logs import logger
 from metagpt.schema import Message
-from pinecone import Pinecone
-
-from lib.dependency_parser import DependencyParser
-
-# for api rate limiting
-async def aask_with_backoff(self, prompt, max_retries=10, base_delay=5):
-    for attempt in range(max_retries):
-        try:
-            return await self._aask(prompt)
-        except Exception as e:
-            if "overloaded_error" not in str(e).lower() and "RemoteProtocolError" not in str(e) and "closed connection" not in str(e) and "httpx" not in str(e): # raise other exception
-                print("raising this error:", str(e))
-                raise
 
-            # last attempt on exp backoff
-            if attempt == max_retries - 1:
-                raise
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-            delay = base_delay * (2 ** attempt)
+from lib.dependency_parser import get_dependency_parser, init_worker, parse_files
+from lib.chunker import SyntaxChunker
+from lib.scanner import ProjectScanner
+from lib.source_store import get_source_store
+from lib.outline import get_outline, format_outline
+from lib.dependency_context import build_dependency_context
+from lib.graph_store import load_graph, save_graph, plan_update, file_record
+from lib.scheduler import DependencyScheduler
+from lib.summary_cache import SummaryCache
+from lib.instrumentation import span, traced
+from lib.cost import get_cost_tracker
+from lib.rate_limiter import (
+    configure_rate_limits, get_rate_limiter, is_overload_error, is_transport_error, retry_delay
+)
 
-            # jitter for rl
-            jitter = delay * 0.2 * (random.random() * 2 - 1)
-            wait_time = delay + jitter
-            
-            print(f"Model API overloaded, retrying in {wait_time:.2f} seconds (attempt {attempt+1}/{max_retries})")
-            await asyncio.sleep(wait_time)
+# cap on llm requests in flight per model, see set_max_inflight
+_max_inflight = 1
+
+
+def set_max_inflight(max_inflight):
+    global _max_inflight
+    _max_inflight = max(1, int(max_inflight))
+    configure_rate_limits(max_concurrency=_max_inflight)
+
+
+def get_max_inflight():
+    return _max_inflight
+
+
+# offline batch submission, see lib/batch.py, disabled until set_batch_broker is called
+_batch_broker = None
+
+
+def set_batch_broker(broker):
+    global _batch_broker
+    _batch_broker = broker
+
+
+# stands in for the provider, e.g. the fake model of benchmarks/fake_llm.py, None calls the real llm
+_llm_override = None
+
+
+def set_llm_override(llm):
+    """llm.aask(model, prompt) answers every prompt, behind the same rate limiter as the real model."""
+    global _llm_override
+    _llm_override = llm
+
+
+# persistent summary cache, disabled until set_summary_cache is called
+_summary_cache = None
+
+
+def set_summary_cache(cache):
+    global _summary_cache
+    _summary_cache = cache
+
+
+def get_summary_cache():
+    return _summary_cache
+
+
+# model tiers by prompt size and file complexity, see lib/router.py, disabled until set_model_router is called
+_model_router = None
+
+
+def set_model_router(router):
+    global _model_router
+    _model_router = router
+
+
+def get_model_router():
+    return _model_router
+
+
+# (id of action, tier name) -> (action, its copy asking the tier's model)
+_tier_actions = {}
+
+
+def tier_action(self, tier):
+    """
+    A copy of the action whose _aask goes to the tier's model. The system prefix lives
+    on the llm, so each action gets its own copy of the tier's llm with its own prefix.
+    """
+    key = (id(self), tier.name)
+    if key not in _tier_actions:
+        action = self.model_copy()
+        action.llm = copy.copy(tier.llm)
+        action.set_prefix(self.prefix)
+        # holding on to the original keeps its id from being reused
+        _tier_actions[key] = (self, action)
+
+    return _tier_actions[key][1]
+
+
+async def cached_aask(self, prompt, *key_parts, file=None):
+    """
+    aask_with_backoff, reusing a previous summary when the action, model and key parts match.
+    With a model router the prompt goes to the tier chosen for its size and file.
+    """
+    prompt_tokens = len(self._tokenize(prompt))
+    tier = _model_router.route(self.name, prompt_tokens, file) if _model_router else None
+
+    if _summary_cache is None:
+        return await aask_with_backoff(self, prompt, tier=tier, prompt_tokens=prompt_tokens)
+
+    key = SummaryCache.make_key(self.name, tier.model if tier else self.config.llm.model, *key_parts)
+    summary = _summary_cache.get(key)
+    if summary is not None:
+        return summary
+
+    summary = await aask_with_backoff(self, prompt, tier=tier, prompt_tokens=prompt_tokens)
+    _summary_cache.put(key, self.name, summary)
+    return summary
+
+
+def format_dependency_context(self, code_text, dependency_summaries, indirect_summaries=None):
+    """Ranked dependency context within self.context_budget tokens, shared by the summarizing actions."""
+    return build_dependency_context(
+        code_text,
+        dependency_summaries,
+        lambda text: len(self._tokenize(text)),
+        self.context_budget,
+        indirect_summaries
+    )
+
+
+def report_prompt_size(file, prompt_tokens, stats):
+    logger.info(
+        f"{os.path.basename(file)}: {prompt_tokens} prompt tokens, {stats['context_tokens']} dependency context "
+        f"tokens per prompt ({stats['full']} full summaries, {stats['abstract']} abstracts), "
+        f"{stats['dropped']} dependencies and {stats['dropped_tokens']} context tokens dropped"
+    )
+
+
+# for api rate limiting, every action using the same model shares one adaptive limiter
+async def aask_with_backoff(self, prompt, max_retries=10, tier=None, prompt_tokens=None):
+    model = tier.model if tier else self.config.llm.model
+    if prompt_tokens is None:
+        prompt_tokens = len(self._tokenize(prompt))
+    costs = get_cost_tracker()
+
+    with span(model, "llm", prompt_tokens=prompt_tokens) as call:
+        # stop before sending anything once the run has spent its investment
+        costs.check()
+
+        # in batch mode the prompt waits for the next batch instead of being sent now
+        if _batch_broker is not None:
+            call.set(batched=True)
+            response = await _batch_broker.submit(model, prompt)
+            completion_tokens = len(self._tokenize(response))
+            call.set(completion_tokens=completion_tokens)
+            costs.charge(model, prompt_tokens, completion_tokens)
+            return response
+
+        limiter = get_rate_limiter(model)
+
+        for attempt in range(max_retries):
+            # waiting out an overload pause is backoff, anything else is queueing for a slot
+            paused = max(0.0, limiter.paused_until - time.monotonic())
+            waited = await limiter.acquire(prompt_tokens)
+            call.add("backoff_seconds", min(waited, paused))
+            call.add("queue_seconds", max(0.0, waited - paused))
+
+            try:
+                if _llm_override is not None:
+                    response = await _llm_override.aask(model, prompt)
+                elif tier is not None:
+                    response = await tier_action(self, tier)._aask(prompt)
+                else:
+                    response = await self._aask(prompt)
+            except Exception as e:
+                overloaded = is_overload_error(e)
+                # only overloads shrink the concurrency limit
+                limiter.release(overloaded=overloaded, failed=not overloaded)
+
+                if not overloaded and not is_transport_error(e): # raise other exception
+                    print("raising this error:", str(e))
+                    raise
+
+                # last attempt
+                if attempt == max_retries - 1:
+                    raise
+
+                call.add("retries", 1)
+                if overloaded:
+                    # the limiter pauses every caller of this model, no per-call sleep needed
+                    print(f"Model API overloaded, concurrency limit now {int(limiter.limit)} (attempt {attempt+1}/{max_retries})")
+                else:
+                    delay = retry_delay(attempt)
+                    call.add("backoff_seconds", delay)
+                    print(f"Connection to the model API failed, retrying in {delay:.2f} seconds (attempt {attempt+1}/{max_retries})")
+                    await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # cancelled, give the slot back
+                limiter.release(failed=True)
+                raise
+
+            completion_tokens = len(self._tokenize(response))
+            call.set(completion_tokens=completion_tokens)
+            limiter.release(completion_tokens=completion_tokens)
+            costs.charge(model, prompt_tokens, completion_tokens)
+            return response
 
 
 # action 1
 class SplitProject(Action):
     name: str = "SplitProject"
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.max_file_size = 1_000_000  # bytes, larger files are skipped, set from --max-file-size
+
     # consider using a tool to accomplish this
+    @traced("action")
     async def run(self, directory, file_extensions):
-        all_files = SplitProject.collect_files(directory)
-        filtered_files = SplitProject.filter_by_extensions(all_files, file_extensions)
+        scanner = ProjectScanner(directory, file_extensions, max_file_size=self.max_file_size)
+        filtered_files = scanner.collect()
 
+        print(scanner.describe())
         print("Total files to summarize:", len(filtered_files))
 
         if not filtered_files:
@@ -51,45 +239,94 @@ class SplitProject(Action):
 
         return filtered_files
 
-    @staticmethod
-    def collect_files(directory: str):
-        found_files = []
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                found_files.append(os.path.join(root, file))
-
-        return found_files
-
-    @staticmethod
-    def filter_by_extensions(files: list[str], extensions: list[str]) -> list[str]:
-        return [f for f in files if any(f.endswith(ext) for ext in extensions)]
-
 
 # action 2
 class BuildDependencyGraph(Action):
     name: str = "BuildDependencyGraph"
 
+    # below this many files the pool start-up costs more than it saves. Trees parsed in
+    # the workers cannot be sent back, so with the pool every file is parsed a second
+    # time in this process when it is chunked, it only pays off on large projects
+    MIN_FILES_FOR_POOL: int = 200
+    POOL_BATCH_SIZE: int = 64
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dependency_graph = {}
+        self.workers = os.cpu_count() or 1
+        self.graph_path = None  # persisted graph artifact, only changed files are re-parsed
+        self.previous_graph = None  # the graph saved by the last run, if there was one
 
     @staticmethod
     def parse_imports(file, project_root):
-        dependency_finder = DependencyParser()
+        dependency_finder = get_dependency_parser()
         deps = dependency_finder.find_dependencies(file, project_root)
-        return deps
+        return sorted(deps)
+
+    def parse_in_pool(self, files, project_root):
+        """Dependencies parsed by worker processes, their source stores and trees are discarded."""
+        java_index = None
+        if any(file.endswith('.java') for file in files):
+            java_index = get_dependency_parser().java_index(project_root)
+
+        batches = [files[i:i + self.POOL_BATCH_SIZE] for i in range(0, len(files), self.POOL_BATCH_SIZE)]
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(project_root, java_index)
+        ) as pool:
+            # map keeps input order, so the merged graph matches the serial one
+            results = pool.map(parse_files, batches, repeat(project_root))
+            return [deps for batch in results for deps in batch]
+
+    def parse_all(self, files, project_root):
+        with span("parse_imports", "graph", files=len(files)):
+            if self.workers > 1 and len(files) >= self.MIN_FILES_FOR_POOL:
+                return self.parse_in_pool(files, project_root)
+
+            return [BuildDependencyGraph.parse_imports(file, project_root) for file in files]
+
+    def build_graph(self, files, project_root):
+        to_parse, reused, records = files, {}, None
+
+        if self.graph_path:
+            saved_graph, saved_records = load_graph(self.graph_path, project_root)
+            self.previous_graph = saved_graph
+            if saved_graph is not None:
+                to_parse, reused, records = plan_update(files, saved_graph, saved_records)
+                print(f"Saved dependency graph: reusing {len(reused)} files, re-parsing {len(to_parse)}")
+
+        parsed = dict(zip(to_parse, self.parse_all(to_parse, project_root)))
+        for file in files:
+            self.dependency_graph[file] = reused[file] if file in reused else parsed[file]
 
+        if self.graph_path:
+            if records is None:
+                records = {file: file_record(file) for file in files}
+            save_graph(self.graph_path, project_root, self.dependency_graph, records)
+
+    @traced("action")
     async def run(self, files, project_root):
-        for file in files:
-            dependencies = BuildDependencyGraph.parse_imports(file, project_root)
-            self.dependency_graph[file] = dependencies
+        # parsing is blocking cpu work, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.build_graph, files, project_root)
 
         # store optimal processing order (files with no dependencies first)
         processing_order = self.determine_processing_order()
 
+        # how much of the graph can be summarized in parallel
+        schedule = DependencyScheduler(self.dependency_graph, processing_order).describe()
+        print(
+            f"Dependency levels: {schedule['levels']}, widest level: {schedule['max_width']} files, "
+            f"critical path: {schedule['critical_path_length']} files, "
+            f"average parallelism: {schedule['average_parallelism']:.1f}"
+        )
+
         return {
             "dependency_graph": self.dependency_graph,
-            "processing_order": processing_order
+            "processing_order": processing_order,
+            "schedule": schedule,
+            "previous_graph": self.previous_graph
         }
 
     def determine_processing_order(self):
@@ -145,15 +382,45 @@ class SummarizeChunks(Action):
         super().__init__(**kwargs)
         self.CHUNK_SIZE = 10000
         self.CHUNK_OVERLAP = 500
+        # tokens of dependency context per prompt, set from --context-budget by the role
+        self.context_budget = 2000
 
     @staticmethod
     def get_code_text(filepath):
-        with open(filepath, 'r') as f:
-            return f.read()
+        # read once per run and shared with the parsers and the other actions
+        return get_source_store().text(filepath)
 
     def create_chunks(self, file):
-        chunks = []
         content = self.get_code_text(file)
+        parser = get_dependency_parser().syntax_parser(file)
+        if parser is None:
+            return self.create_token_chunks(content)
+
+        # usually already parsed while the dependency graph was built
+        tree = get_source_store().tree(file, parser)
+
+        # whole declarations per chunk, only declarations over the budget are cut
+        chunker = SyntaxChunker(
+            parser,
+            lambda text: len(self._tokenize(text)),
+            self.CHUNK_SIZE,
+            self.CHUNK_OVERLAP
+        )
+
+        return [
+            {
+                'content': chunk_content,
+                'chunk_number': i + 1,
+                'start_line': start_line,
+                'end_line': end_line,
+                'summary': "",
+            }
+            for i, (start_line, end_line, chunk_content) in enumerate(chunker.chunk(content, tree))
+        ]
+
+    def create_token_chunks(self, content):
+        # fixed token windows for languages without a syntax tree
+        chunks = []
         tokens = self._tokenize(content)
 
         current_pos = 0
@@ -179,32 +446,33 @@ class SummarizeChunks(Action):
 
         return chunks
 
-    def format_dependency_context(self, dependency_summaries):
-        if not dependency_summaries:
-            return "No dependencies."
-
-        formatted = "This file depends on:\n"
-        for dep, summary in dependency_summaries.items():
-            formatted += f"- {os.path.basename(dep)}: {summary}\n"
-
-        return formatted
-
-
-    async def run(self, file, dependency_summaries):
+    @traced("action")
+    async def run(self, file, dependency_summaries, indirect_summaries=None):
         chunks = self.create_chunks(file)
         
-        # format dependency summaries for prompt
-        dependency_context = self.format_dependency_context(dependency_summaries)
+        # format dependency summaries for prompt, ranked and cut to the budget
+        dependency_context, stats = format_dependency_context(
+            self, self.get_code_text(file), dependency_summaries, indirect_summaries
+        )
+        prompt_tokens = 0
         
-        for chunk in chunks:
+        async def summarize_chunk(chunk):
+            nonlocal prompt_tokens
             prompt = self.PROMPT_TEMPLATE.format(
                 code_text=chunk["content"], 
                 dependency_summaries=dependency_context
             )
+            prompt_tokens += len(self._tokenize(prompt))
             
             # summarize current chunk
-            chunk_summary = await aask_with_backoff(self, prompt) #self._aask(prompt)
+            chunk_summary = await cached_aask(
+                self, prompt, self.PROMPT_TEMPLATE, chunk["content"], dependency_context, file=file
+            )
             chunk["summary"] = chunk_summary
+
+        # chunks are independent, the shared in-flight cap bounds the fan-out
+        await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+        report_prompt_size(file, prompt_tokens, stats)
         
         return chunks
 
@@ -224,14 +492,38 @@ class CombineChunkSummaries(Action):
     your summary:
     """
 
-    async def run(self, chunks):
+    # summaries combined per call, bounds the prompt for files with hundreds of chunks
+    COMBINE_FANOUT: int = 8
+
+    @traced("action")
+    async def run(self, chunks, file=None):
         # extract chunk summaries
         chunk_summaries = [chunk["summary"] for chunk in chunks]
-        summaries_text = "\n".join(chunk_summaries)
+
+        # a single chunk summary already is the file summary, paraphrasing it buys nothing
+        if len(chunk_summaries) <= 1:
+            return chunk_summaries[0] if chunk_summaries else ""
+
+        # reduce as a tree, the groups of one level are combined concurrently
+        summaries = chunk_summaries
+        while len(summaries) > 1:
+            groups = [summaries[i:i + self.COMBINE_FANOUT] for i in range(0, len(summaries), self.COMBINE_FANOUT)]
+            summaries = await asyncio.gather(*(self.combine(group, file) for group in groups))
+
+        return summaries[0]
+
+    async def combine(self, summaries, file=None):
+        # a leftover group of one moves up a level unchanged
+        if len(summaries) == 1:
+            return summaries[0]
+
+        summaries_text = "\n".join(summaries)
         
         # generate combined summary
         prompt = self.COMBINE_SUMMARIES_PROMPT.format(summaries=summaries_text)
-        combined_summary = await aask_with_backoff(self, prompt) #self._aask(prompt)
+        combined_summary = await cached_aask(
+            self, prompt, self.COMBINE_SUMMARIES_PROMPT, summaries_text, file=file
+        )
         
         return combined_summary
 
@@ -261,49 +553,38 @@ class FileSummarizer(Action):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.MAX_RELEVANT_CODE_SECTIONS = 10
+        self.MAX_RELEVANT_CODE_SECTIONS = 40  # outline entries, classes and their members
         self.FALLBACK_CHARACTER_COUNT = 600
 
-        #self.init_pinecone()
-        self.pc_namespace = None
-        self.pc = None
-        self.index = None
+        # tokens of dependency context per prompt, set from --context-budget by the role
+        self.context_budget = 2000
+
+        # set by the role, a lib.vector_store.BufferedUpserter around the run's vector store
+        self.upserter = None
 
 
     @staticmethod
     def get_code_text(filepath):
-        with open(filepath, 'r') as f:
-            return f.read()
-
-    def init_pinecone(self, pc_index):
-        self.pc_namespace = pc_index # should be namespace, but naming error...
-        self.pc = Pinecone(api_key="pcsk_xn2YX_PrADNhizLCFVwYRrxx6Z488j1PLGKuXADxit5LGTHEbjnK97xrQRBiDt6SdT5JS")
-        self.index = self.pc.Index("codestallation")
+        # read once per run and shared with the parsers and the other actions
+        return get_source_store().text(filepath)
 
 
     def extract_key_code_sections(self, filepath):
-        code_text = self.get_code_text(filepath)
-
-        # TODO: enhance this function
-        import re
-
-        # class definitions
-        class_defs = re.findall(r'class\s+\w+(?:\(.*?\))?\s*:.*?(?=\n\n|\Z)', code_text, re.DOTALL)
-
-        # functions or methods
-        func_defs = re.findall(r'def\s+\w+\(.*?\).*?:.*?(?=\n\n|\Z)', code_text, re.DOTALL)
-
-        sections = class_defs + func_defs
+        # signatures, docstrings and line spans from the parse tree, cached per file
+        outline = get_outline(filepath)
 
-        # plan b: return first part of file if nothing found
-        if len("\n\n".join(sections)) < 200 and len(code_text) > 200:
-            return code_text[:self.FALLBACK_CHARACTER_COUNT]
+        # plan b: return first part of file for other languages and files without declarations
+        if not outline:
+            return self.get_code_text(filepath)[:self.FALLBACK_CHARACTER_COUNT]
 
-        return "\n\n".join(sections[:self.MAX_RELEVANT_CODE_SECTIONS])
+        return format_outline(outline, self.MAX_RELEVANT_CODE_SECTIONS)
 
-    async def run(self, file, file_summary, dependency_summaries, pc_index):
-        # dependency context info
-        dependency_context = self.format_dependency_context(dependency_summaries)
+    @traced("action")
+    async def run(self, file, file_summary, dependency_summaries, pc_index, indirect_summaries=None):
+        # dependency context info, ranked and cut to the budget
+        dependency_context, stats = format_dependency_context(
+            self, self.get_code_text(file), dependency_summaries, indirect_summaries
+        )
 
         # the key sections to focus on in the prompt
         code_sections = self.extract_key_code_sections(file)
@@ -314,61 +595,16 @@ class FileSummarizer(Action):
             dependency_context=dependency_context
         )
 
-        final_summary = await aask_with_backoff(self, prompt) #self._aask(prompt)
+        final_summary = await cached_aask(
+            self, prompt, self.FILE_SUMMARY_PROMPT, self.get_code_text(file),
+            file_summary, code_sections, dependency_context, file=file
+        )
+        report_prompt_size(file, len(self._tokenize(prompt)), stats)
 
-        await self.save_summary(file, final_summary, pc_index)
+        await self.save_summary(file, final_summary)
 
         return final_summary
 
-    def format_dependency_context(self, dependency_summaries):
-        if not dependency_summaries:
-            return "No dependencies."
-
-        formatted = "This file depends on:\n"
-        for dep, summary in dependency_summaries.items():
-            formatted += f"- {os.path.basename(dep)}: {summary}\n"
-
-        return formatted
-
-    async def save_summary(self, file_id, summary, pc_index):
-        #self.init_pinecone(pc_index)
-        
-        base_delay = 5
-        max_retries = 10
-
-
-        for attempt in range(max_retries):
-            try:
-                self.init_pinecone(pc_index)
-
-                embeddings = self.pc.inference.embed(
-                    model="llama-text-embed-v2",
-                    inputs=[summary if summary.strip() else "no summary was produced by the model"],
-                    parameters={"input_type": "passage"}
-                )
-
-                record = [{
-                    "id": file_id,
-                    "values": embeddings[0]["values"],
-                    "metadata": {"text": summary}
-                }]
-
-                self.index.upsert(
-                    vectors=record,
-                    namespace=self.pc_namespace
-                )
-
-                return
-            except Exception as e:
-                # last attempt on exp backoff
-                if attempt == max_retries - 1:
-                    raise
-
-                delay = base_delay * (2 ** attempt)
-
-                # jitter for rl
-                jitter = delay * 0.2 * (random.random() * 2 - 1)
-                wait_time = delay + jitter
-
-                print(f"Pinecone API overloaded, retrying in {wait_time:.2f} seconds (attempt {attempt+1}/{max_retries})")
-                await asyncio.sleep(wait_time)
+    async def save_summary(self, file_id, summary):
+        # buffered, the upserter embeds and writes whole batches
+        await self.upserter.add(file_id, summary)
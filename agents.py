@@ -1,3 +1,6 @@
+import os
+import time
+import asyncio
 from metagpt.roles import Role
 from metagpt.logs import logger
 from metagpt.schema import Message
@@ -8,8 +11,32 @@ from actions import (
     BuildDependencyGraph, 
     SummarizeChunks, 
     CombineChunkSummaries, 
-    FileSummarizer
+    FileSummarizer,
+    get_max_inflight,
+    get_summary_cache,
+    get_model_router
 )
+from lib.scheduler import DependencyScheduler, StreamingScheduler
+from lib.graph_store import save_graph, file_record
+from lib.incremental import changed_files, stale_files
+from lib.vector_store import BufferedUpserter
+from lib.scanner import ProjectScanner
+from lib.artifact_store import get_artifact_store
+from lib.dependency_context import gather_dependency_summaries
+from lib.instrumentation import traced
+from lib.journal import get_run_journal
+
+
+async def run_bounded(items, worker):
+    """Run worker over items concurrently with at most max_inflight active at once."""
+    slots = asyncio.Semaphore(get_max_inflight())
+
+    async def run_one(item):
+        async with slots:
+            return await worker(item)
+
+    return await asyncio.gather(*(run_one(item) for item in items))
+
 
 class ProjectSplitter(Role):
     name: str = "ProjectSplitter"
@@ -18,11 +45,14 @@ class ProjectSplitter(Role):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.file_extensions = kwargs.get("file_extensions", ["py", "java"])
+        self.max_file_size = kwargs.get("max_file_size", 1_000_000)
         self.set_actions([SplitProject])
         
+    @traced("role")
     async def _act(self) -> Message:
         logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
         todo = self.rc.todo
+        todo.max_file_size = self.max_file_size
         
         root_directory = self.get_memories(k=1)[0].content
         code_files = await todo.run(root_directory, self.file_extensions)
@@ -45,7 +75,30 @@ class DependencyGraphBuilder(Role):
         super().__init__(**kwargs)
         self.set_actions([BuildDependencyGraph])
         self._watch({SplitProject})  # Watch for SplitProject completion
+        self.since = kwargs.get("since")  # git revision for incremental runs
+        self.graph_workers = kwargs.get("graph_workers", 0)  # 0 uses every core
+        self.graph_path = kwargs.get("graph_path")  # where the graph is persisted between runs
     
+    def restrict_to_stale(self, dependency_graph, processing_order, project_root, previous_graph=None):
+        changed = changed_files(project_root, self.since)
+
+        # files that were never documented have no previous summary to fall back on
+        cache = get_summary_cache()
+        undocumented = {
+            os.path.realpath(file) for file in dependency_graph
+            if cache.get_file_summary(file, "final") is None
+        }
+
+        # the saved graph still knows who imported files that were deleted or renamed since
+        stale = stale_files(dependency_graph, changed | undocumented, previous_graph)
+        print(
+            f"Incremental run since {self.since}: {len(changed)} changed files, "
+            f"re-summarizing {len(stale)} of {len(dependency_graph)} files"
+        )
+
+        return [file for file in processing_order if file in stale]
+
+    @traced("role")
     async def _act(self) -> Message:
         logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
         todo = self.rc.todo
@@ -55,10 +108,32 @@ class DependencyGraphBuilder(Role):
         files_msg = message_queue[0]
         project_root = message_queue[1].content
         code_files = files_msg.content.split(",")
+
+        if self.graph_workers:
+            todo.workers = self.graph_workers
+        todo.graph_path = self.graph_path
         
         result = await todo.run(code_files, project_root)
         dependency_graph = result["dependency_graph"]
         processing_order = result["processing_order"]
+        schedule = result["schedule"]
+
+        # the router sends prompts of files many others import to the large model
+        router = get_model_router()
+        if router:
+            router.index_graph(dependency_graph)
+
+        # on --resume, journaled summaries that depend on a since edited file are redone
+        journal = get_run_journal()
+        if journal:
+            journal.invalidate(dependency_graph, result["previous_graph"])
+
+        # only the changed files and everything that depends on them are re-run
+        if self.since:
+            processing_order = self.restrict_to_stale(
+                dependency_graph, processing_order, project_root, result["previous_graph"]
+            )
+            schedule = DependencyScheduler(dependency_graph, processing_order).describe()
         
         graph_msg = Message(
             content="dependency_graph", 
@@ -71,7 +146,7 @@ class DependencyGraphBuilder(Role):
             content="processing_order", 
             role=self.profile, 
             cause_by=type(todo),
-            metadata={"processing_order": processing_order}
+            metadata={"processing_order": processing_order, "schedule": schedule}
         )
         
         #self.rc.memory.add(graph_msg)
@@ -90,11 +165,13 @@ class ChunkSummarizer(Role):
         super().__init__(**kwargs)
         self.set_actions([SummarizeChunks])
         self._watch({BuildDependencyGraph})
-        self.file_chunks = {}  # keep track of chunk summaries for each file
+        self.context_budget = kwargs.get("context_budget", 2000)  # dependency context tokens per prompt
     
+    @traced("role")
     async def _act(self) -> Message:
         logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
         todo = self.rc.todo
+        todo.context_budget = self.context_budget
         
         memories = self.get_memories()
         
@@ -114,44 +191,66 @@ class ChunkSummarizer(Role):
             if mem.content and not mem.content.startswith('{') and ',' not in mem.content:
                 project_root = mem.content
         
-        if not dependency_graph or not processing_order or not project_root:
+        if not dependency_graph or processing_order is None or not project_root:
             logger.error("Missing required information for chunk summarization.")
             return Message(content="error", role=self.profile)
         
-        # for in case we need these later
+        # joined chunk summaries, used as dependency context for later files
         summaries = {}
-        
-        for file in processing_order:
-            dependency_summaries = []
-            # use dependencies for context if they exist
-            for dep in dependency_graph.get(file, []):
-                if dep in summaries:
-                    dependency_summaries.append(summaries[dep])
-            
-            # summarize the chunks
-            chunks = await todo.run(file, dependency_summaries)
-            self.file_chunks[file] = chunks
-            
-            # publish chunks and summaries to be joined by the next agent
+
+        # files are released as soon as their in-project dependencies are summarized
+        scheduler = DependencyScheduler(dependency_graph, processing_order)
+
+        cache = get_summary_cache()
+        journal = get_run_journal()
+        artifacts = get_artifact_store()
+        in_run = set(processing_order)
+
+        def lookup(dep):
+            if dep in summaries:
+                return summaries[dep]
+            # in incremental runs, unaffected dependencies keep their summaries from the last run
+            if cache and dep in dependency_graph and dep not in in_run:
+                return cache.get_file_summary(dep, "chunks")
+            return None
+
+        async def summarize_file(file):
+            # use dependencies and their dependencies for context if they exist
+            dependency_summaries, indirect_summaries = gather_dependency_summaries(file, dependency_graph, lookup)
+
+            # summarize the chunks, unless a resumed run already did
+            chunks = journal.get("chunks", file) if journal else None
+            if chunks is None:
+                chunks = await todo.run(file, dependency_summaries, indirect_summaries)
+                if journal:
+                    await journal.record_chunks(file, chunks)
+
+            summaries[file] = " ".join(chunk["summary"] for chunk in chunks)
+            if cache:
+                cache.put_file_summary(file, "chunks", summaries[file])
+
+            # the chunks go to the artifact store, the message only carries a handle to them
+            handle = artifacts.put_chunks(file, chunks)
             chunks_msg = Message(
                 content=f"chunks_{file}", 
                 role=self.profile, 
                 cause_by=type(todo),
                 send_to={"ChunkSummaryCombiner"},
-                metadata={"file": file, "chunks": chunks}
+                metadata={"file": file, "chunk_handle": handle}
             )
             
-            self.rc.memory.add(chunks_msg)
-            # maybe don't want this
             self.rc.env.publish_message(chunks_msg)
 
+        # a failure in one file cancels the rest, like the serial loop did
+        await scheduler.run(summarize_file, get_max_inflight())
+
         
         # completed message
         summary_msg = Message(
             content="all_chunks_summarized", 
             role=self.profile, 
             cause_by=type(todo),
-            metadata={"file_chunks": self.file_chunks}
+            metadata={"files_summarized": len(summaries)}
         )
         
         self.rc.env.publish_message(summary_msg)
@@ -168,33 +267,51 @@ class ChunkSummaryCombiner(Role):
         self._watch({SummarizeChunks})  
         self.file_summaries = {}
 
+    @traced("role")
     async def _act(self) -> Message:
         logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
         todo = self.rc.todo
         
         memories = self.get_memories()
         
-        # process each chunk as it comes in
-        for mem in memories:
-            if hasattr(mem, 'metadata') and mem.metadata and 'chunks' in mem.metadata:
-                file = mem.metadata['file']
-                chunks = mem.metadata['chunks']
-                
-                # form the file summary by combining prompts
-                file_summary = await todo.run(chunks)
-                self.file_summaries[file] = file_summary
-                
-                # publish the full file summary
-                summary_msg = Message(
-                    content=f"file_summary_{file}", 
-                    role=self.profile, 
-                    cause_by=type(todo),
-                    send_to={"FileLevelSummarizer"},
-                    metadata={"file": file, "summary": file_summary}
-                )
-                
-                self.rc.memory.add(summary_msg)
-                self.rc.env.publish_message(summary_msg)
+        cache = get_summary_cache()
+        journal = get_run_journal()
+        artifacts = get_artifact_store()
+        chunk_messages = [
+            mem for mem in memories
+            if hasattr(mem, 'metadata') and mem.metadata and 'chunk_handle' in mem.metadata
+        ]
+
+        # process each file's chunks, files are independent of each other here
+        async def combine_file(mem):
+            file = mem.metadata['file']
+            handle = mem.metadata['chunk_handle']
+            chunks = artifacts.get_chunks(handle)
+            
+            # form the file summary by combining prompts
+            file_summary = journal.get("combined", file) if journal else None
+            if file_summary is None:
+                file_summary = await todo.run(chunks, file)
+                if journal:
+                    await journal.record_summary("combined", file, file_summary)
+            artifacts.discard(handle)
+            self.file_summaries[file] = file_summary
+            if cache:
+                cache.put_file_summary(file, "combined", file_summary)
+            
+            # publish the full file summary
+            summary_msg = Message(
+                content=f"file_summary_{file}", 
+                role=self.profile, 
+                cause_by=type(todo),
+                send_to={"FileLevelSummarizer"},
+                metadata={"file": file, "summary": file_summary}
+            )
+            
+            self.rc.memory.add(summary_msg)
+            self.rc.env.publish_message(summary_msg)
+
+        await run_bounded(chunk_messages, combine_file)
         
         # completed notification message
         all_summaries_msg = Message(
@@ -218,16 +335,22 @@ class FileLevelSummarizer(Role):
         #self._watch({CombineChunkSummaries})
         
         self.pc_index = kwargs.get("pinecone_index", "metagpt")
+        self.vector_store = kwargs.get("vector_store")
+        self.upsert_batch_size = kwargs.get("upsert_batch_size", 96)
+        self.upsert_flush_interval = kwargs.get("upsert_flush_interval", 30.0)
+        self.context_budget = kwargs.get("context_budget", 2000)  # dependency context tokens per prompt
         self.final_summaries = {}
     
+    @traced("role")
     async def _act(self) -> Message:
         logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
         todo = self.rc.todo
+        todo.context_budget = self.context_budget
         
         # get existing summaries and dependency graph
         memories = self.get_memories()
         
-        file_summaries = {}
+        file_summaries = None
         dependency_graph = None
         
         for mem in memories:
@@ -236,27 +359,59 @@ class FileLevelSummarizer(Role):
                     file_summaries = mem.metadata['file_summaries']
                 elif 'dependency_graph' in mem.metadata:
                     dependency_graph = mem.metadata['dependency_graph']
+
+        # an incremental run where no file changed has nothing left to summarize
+        if file_summaries is not None and not file_summaries:
+            return Message(content="no_files_to_summarize", role=self.profile)
         
         if not file_summaries or not dependency_graph:
             logger.error("Missing required information for file-level summarization")
             return Message(content="error", role=self.profile)
+
+        journal = get_run_journal()
+
+        # one buffer for the whole run, summaries are embedded and upserted in batches
+        todo.upserter = BufferedUpserter(
+            self.vector_store,
+            self.pc_index,
+            batch_size=self.upsert_batch_size,
+            flush_interval=self.upsert_flush_interval,
+            on_write=journal.record_indexed if journal else None
+        )
         
-        # process each file
-        for file, summary in file_summaries.items():
-            dependency_summaries = {}
-            for dep in dependency_graph.get(file, []):
-                if dep in file_summaries:
-                    dependency_summaries[dep] = file_summaries[dep]
-            
-            # finalize the current file's summary
-            final_summary = await todo.run(
-                file, 
-                summary, 
-                dependency_summaries,
-                self.pc_index
-            )
+        cache = get_summary_cache()
+
+        def lookup(dep):
+            if dep in file_summaries:
+                return file_summaries[dep]
+            # dependency was not affected by this incremental run
+            if cache and dep in dependency_graph:
+                return cache.get_file_summary(dep, "combined")
+            return None
+
+        # process each file, all combined summaries already exist so files are independent
+        async def finalize_file(file):
+            summary = file_summaries[file]
+            dependency_summaries, indirect_summaries = gather_dependency_summaries(file, dependency_graph, lookup)
             
-            self.final_summaries[file] = final_summary
+            final_summary = journal.get("final", file) if journal else None
+            if final_summary is not None:
+                # resumed, only a summary that never reached the vector store is written again
+                if file not in journal.indexed:
+                    await todo.save_summary(file, final_summary)
+            else:
+                # finalize the current file's summary
+                final_summary = await todo.run(
+                    file, 
+                    summary, 
+                    dependency_summaries,
+                    self.pc_index,
+                    indirect_summaries
+                )
+                if journal:
+                    await journal.record_summary("final", file, final_summary)
+            if cache:
+                cache.put_file_summary(file, "final", final_summary)
             
             summary_msg = Message(
                 content=f"final_summary_{file}", 
@@ -267,6 +422,17 @@ class FileLevelSummarizer(Role):
             
             self.rc.memory.add(summary_msg)
             self.rc.env.publish_message(summary_msg)
+            return final_summary
+
+        files = list(file_summaries)
+        final_summaries = await run_bounded(files, finalize_file)
+
+        # write whatever is still buffered
+        await todo.upserter.flush()
+
+        # keep the output in input order regardless of completion order
+        for file, final_summary in zip(files, final_summaries):
+            self.final_summaries[file] = final_summary
         
         # publish finalized summary
         final_msg = Message(
@@ -278,3 +444,172 @@ class FileLevelSummarizer(Role):
         
         self.rc.env.publish_message(final_msg)
         return final_msg
+
+
+class StreamingSummarizer(Role):
+    """
+    Streaming alternative to the staged roles above (--stream). Files flow from the
+    directory walk through dependency parsing into a StreamingScheduler, and every file
+    goes through chunk, combined and final summarization as soon as its dependencies
+    are done, so leaf files are summarized while the rest of the tree is still scanned.
+    The queues between the stages are bounded, which keeps memory flat on huge projects.
+    """
+    name: str = "StreamingSummarizer"
+    profile: str = "StreamingSummarizer"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.set_actions([SummarizeChunks])
+
+        self.file_extensions = kwargs.get("file_extensions", ["py", "java"])
+        self.max_file_size = kwargs.get("max_file_size", 1_000_000)
+        self.queue_size = kwargs.get("queue_size", 1000)  # files buffered between two stages
+        # files documented at once, --max-inflight and not the in-flight cap batch mode lifts
+        self.workers = kwargs.get("workers") or get_max_inflight()
+        self.graph_path = kwargs.get("graph_path")
+        self.pc_index = kwargs.get("pinecone_index", "metagpt")
+        self.vector_store = kwargs.get("vector_store")
+        self.upsert_batch_size = kwargs.get("upsert_batch_size", 96)
+        self.upsert_flush_interval = kwargs.get("upsert_flush_interval", 30.0)
+        self.context_budget = kwargs.get("context_budget", 2000)
+
+        # the later stages may run on other models, like the staged roles
+        self.combine_config = kwargs.get("combine_config") or self.config
+        self.final_config = kwargs.get("final_config") or self.config
+        self.final_summaries = {}
+
+    async def scan(self, project_root, paths):
+        scanner = ProjectScanner(project_root, self.file_extensions, max_file_size=self.max_file_size)
+        for path in scanner.scan():
+            # blocks while the parsing stage is behind
+            await paths.put(path)
+
+        await paths.put(None)
+        print(scanner.describe())
+
+    async def parse(self, project_root, paths, scheduler):
+        loop = asyncio.get_running_loop()
+        router = get_model_router()
+
+        # the shared tree-sitter parsers are not thread safe, so files are parsed one at a
+        # time off the event loop, which still overlaps with the summarizers
+        while (file := await paths.get()) is not None:
+            deps = await loop.run_in_executor(None, BuildDependencyGraph.parse_imports, file, project_root)
+            if router:
+                # importers parsed later are not counted yet, early files look less central
+                router.add_file(file, deps)
+            await scheduler.add(file, deps)
+
+        await scheduler.close()
+        print(f"Dependency graph complete: {len(scheduler.dependency_graph)} files")
+
+    @traced("role")
+    async def _act(self) -> Message:
+        logger.info(f"{self._setting}: to do {self.rc.todo}({self.rc.todo.name})")
+        summarize = self.rc.todo
+        summarize.context_budget = self.context_budget
+        combine = CombineChunkSummaries(config=self.combine_config)
+        finalize = FileSummarizer(config=self.final_config)
+        finalize.context_budget = self.context_budget
+        journal = get_run_journal()
+        finalize.upserter = BufferedUpserter(
+            self.vector_store,
+            self.pc_index,
+            batch_size=self.upsert_batch_size,
+            flush_interval=self.upsert_flush_interval,
+            on_write=journal.record_indexed if journal else None
+        )
+
+        project_root = self.get_memories(k=1)[0].content
+        paths = asyncio.Queue(maxsize=self.queue_size)
+        scheduler = StreamingScheduler(self.queue_size)
+
+        cache = get_summary_cache()
+        chunk_summaries = {}
+        file_summaries = {}
+        start = time.monotonic()
+
+        async def document(file):
+            graph = scheduler.dependency_graph
+
+            # dependencies are done before their dependents start, the cycle edges
+            # broken by the scheduler are the only ones without a summary yet
+            # every stage a resumed run already finished is taken from the journal
+            chunks = journal.get("chunks", file) if journal else None
+            if chunks is None:
+                dependency_summaries, indirect_summaries = gather_dependency_summaries(file, graph, chunk_summaries.get)
+                chunks = await summarize.run(file, dependency_summaries, indirect_summaries)
+                if journal:
+                    await journal.record_chunks(file, chunks)
+            chunk_summaries[file] = " ".join(chunk["summary"] for chunk in chunks)
+
+            file_summary = journal.get("combined", file) if journal else None
+            if file_summary is None:
+                file_summary = await combine.run(chunks, file)
+                if journal:
+                    await journal.record_summary("combined", file, file_summary)
+            file_summaries[file] = file_summary
+
+            final_summary = journal.get("final", file) if journal else None
+            if final_summary is None:
+                dependency_summaries, indirect_summaries = gather_dependency_summaries(file, graph, file_summaries.get)
+                final_summary = await finalize.run(
+                    file, file_summary, dependency_summaries, self.pc_index, indirect_summaries
+                )
+                if journal:
+                    await journal.record_summary("final", file, final_summary)
+            elif file not in journal.indexed:
+                await finalize.save_summary(file, final_summary)
+            self.final_summaries[file] = final_summary
+
+            if cache:
+                cache.put_file_summary(file, "chunks", chunk_summaries[file])
+                cache.put_file_summary(file, "combined", file_summary)
+                cache.put_file_summary(file, "final", final_summary)
+
+        first_release = True
+
+        async def work():
+            nonlocal first_release
+            while (file := await scheduler.next()) is not None:
+                if first_release:
+                    first_release = False
+                    print(
+                        f"First file released after {time.monotonic() - start:.1f}s, "
+                        f"{len(scheduler.dependency_graph)} files parsed so far"
+                    )
+                await document(file)
+                await scheduler.done(file)
+
+        # a failure in any stage cancels the others
+        async with asyncio.TaskGroup() as group:
+            group.create_task(self.scan(project_root, paths))
+            group.create_task(self.parse(project_root, paths, scheduler))
+            for _ in range(self.workers):
+                group.create_task(work())
+
+        await finalize.upserter.flush()
+        print(
+            f"Streamed {len(self.final_summaries)} files in {time.monotonic() - start:.1f}s, "
+            f"at most {scheduler.max_pending} files were waiting for their dependencies"
+        )
+
+        if self.graph_path:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.save_graph, scheduler.dependency_graph, project_root)
+
+        final_msg = Message(
+            content="documentation_complete",
+            role=self.profile,
+            cause_by=type(summarize),
+            metadata={"final_summaries": self.final_summaries}
+        )
+
+        self.rc.env.publish_message(final_msg)
+        return final_msg
+
+    def save_graph(self, dependency_graph, project_root):
+        # unresolved dependencies were dropped by the scheduler, drop them from the artifact too
+        graph = {file: [dep for dep in deps if dep in dependency_graph] for file, deps in dependency_graph.items()}
+        records = {file: file_record(file) for file in graph}
+        save_graph(self.graph_path, project_root, graph, records)
@@ -0,0 +1,197 @@
+"""
+End-to-end pipeline benchmark against a fake model, so the orchestration overhead (scan,
+graph, chunking, message passing, vector writes) can be measured without any network.
+
+    python -m benchmarks.bench_pipeline run --files=10000 --language=java --latency=0.05
+    python -m benchmarks.bench_pipeline suite --output=bench.json
+    python -m benchmarks.bench_pipeline suite --sizes=100,10000 --baseline=bench.json
+
+suite runs every size in its own process, so peak memory is measured per run. With
+--baseline it exits non-zero when throughput or peak memory regress by more than
+--tolerance against an earlier --output file.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import resource
+import tempfile
+import subprocess
+import fire
+
+from benchmarks.fake_llm import FakeLLM
+from benchmarks.synthetic_repo import generate_repo
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+# pipeline stage of every role, read from the role spans of the run report
+STAGES = {
+    "ProjectSplitter": "scan",
+    "DependencyGraphBuilder": "graph",
+    "ChunkSummarizer": "chunk summaries",
+    "ChunkSummaryCombiner": "combine",
+    "FileLevelSummarizer": "final summaries",
+    "StreamingSummarizer": "stream",
+}
+
+
+async def benchmark(files, language, latency, jitter, max_inflight, stream, workdir):
+    # metagpt and the model configurations load here, not when the suite starts
+    import main as pipeline
+    from actions import set_llm_override
+    from lib.instrumentation import get_tracer
+
+    repo = os.path.join(workdir, "repo")
+    start = time.perf_counter()
+    generate_repo(repo, files, language)
+    generate_seconds = time.perf_counter() - start
+
+    llm = FakeLLM(latency=latency, jitter=jitter)
+    set_llm_override(llm)
+
+    start = time.perf_counter()
+    await pipeline.main(
+        idea=repo,
+        # the fake model is free, never stop on the haiku prices
+        investment=float("inf"),
+        pinecone_index="benchmark",
+        file_extensions="java" if language == "java" else "py",
+        max_inflight=max_inflight,
+        state_dir=os.path.join(workdir, "state"),
+        cache=False,
+        vector_store="local",
+        stream=stream,
+        print_summaries=False,
+    )
+    wall_seconds = time.perf_counter() - start
+
+    roles = get_tracer().report()["categories"].get("role", {})
+    stage_seconds = {STAGES.get(name, name): totals["total_seconds"] for name, totals in roles.items()}
+
+    llm_stats = llm.stats()
+    # what the run would take if the model were the only cost and always saturated
+    ideal_seconds = llm_stats["model_seconds"] / max_inflight
+
+    return {
+        "files": files,
+        "language": language,
+        "stream": stream,
+        "max_inflight": max_inflight,
+        "latency": latency,
+        "jitter": jitter,
+        "generate_seconds": generate_seconds,
+        "wall_seconds": wall_seconds,
+        "files_per_second": files / wall_seconds if wall_seconds else 0.0,
+        "ideal_model_seconds": ideal_seconds,
+        "stages": stage_seconds,
+        "llm": llm_stats,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def report(result):
+    print(
+        f"{result['language']} {result['files']} files{' (stream)' if result['stream'] else ''}: "
+        f"{result['wall_seconds']:.1f}s, {result['files_per_second']:.1f} files/sec, "
+        f"{result['llm']['calls']} model calls (ideal {result['ideal_model_seconds']:.1f}s), "
+        f"peak {result['peak_rss_mb']:.0f} MB"
+    )
+    for stage, seconds in result["stages"].items():
+        print(f"    {stage:<16} {seconds:8.2f}s")
+
+
+def run(files=100, language="python", latency=0.05, jitter=0.02, max_inflight=64, stream=False,
+        workdir=None, keep=False, result_path=None):
+    """Benchmark one synthetic project in this process."""
+    workdir = workdir or tempfile.mkdtemp(prefix="codestallation-bench-")
+    try:
+        result = asyncio.run(benchmark(files, language, latency, jitter, max_inflight, stream, workdir))
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report(result)
+    if result_path:
+        with open(result_path, "w") as f:
+            json.dump(result, f)
+
+
+def as_list(value, cast):
+    if isinstance(value, (list, tuple)):
+        return [cast(item) for item in value]
+    return [cast(item) for item in str(value).split(",")]
+
+
+def result_key(result):
+    return f"{result['language']}-{result['files']}-{'stream' if result['stream'] else 'staged'}"
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None:
+            continue
+        if result["files_per_second"] < previous["files_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{result_key(result)}: {result['files_per_second']:.1f} files/sec, "
+                f"baseline {previous['files_per_second']:.1f}"
+            )
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{result_key(result)}: peak {result['peak_rss_mb']:.0f} MB, baseline {previous['peak_rss_mb']:.0f} MB"
+            )
+
+    return regressions
+
+
+def suite(sizes="100,10000,100000", languages="python,java", latency=0.05, jitter=0.02, max_inflight=64,
+          stream=False, output=None, baseline=None, tolerance=0.25):
+    """Benchmark every size and language, each in a fresh process."""
+    results = []
+    for language in as_list(languages, str):
+        for files in as_list(sizes, int):
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                result_path = f.name
+
+            command = [
+                sys.executable, "-m", "benchmarks.bench_pipeline", "run",
+                f"--files={files}", f"--language={language}", f"--latency={latency}", f"--jitter={jitter}",
+                f"--max_inflight={max_inflight}", f"--result_path={result_path}",
+            ]
+            if stream:
+                command.append("--stream")
+
+            # the pipeline's own output is noise here, only the result file matters
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            with open(result_path) as f:
+                result = json.load(f)
+            os.remove(result_path)
+
+            report(result)
+            results.append(result)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    fire.Fire({"run": run, "suite": suite})
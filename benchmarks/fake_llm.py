@@ -0,0 +1,46 @@
+import random
+import asyncio
+
+from lib.batch import LocalBatchProcessor
+
+
+def estimate_tokens(text):
+    # roughly four characters per token, close enough for the benchmark's counters
+    return max(1, len(text) // 4)
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for the model provider. Every prompt is answered with a canned
+    summary after `latency` seconds, plus or minus up to `jitter` seconds. Install it with
+    actions.set_llm_override, calls still go through the shared rate limiter.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.02, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.busy_seconds = 0.0
+
+    async def aask(self, model, prompt):
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+
+        response = LocalBatchProcessor.canned_summary(model, prompt)
+        self.calls += 1
+        self.prompt_tokens += estimate_tokens(prompt)
+        self.completion_tokens += estimate_tokens(response)
+        self.busy_seconds += delay
+        return response
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "model_seconds": self.busy_seconds,
+        }
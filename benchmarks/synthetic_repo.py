@@ -0,0 +1,85 @@
+"""
+Synthetic Python and Java projects with a layered import graph, for benchmarks.
+
+    python -m benchmarks.synthetic_repo <directory> --files=10000 --language=java
+"""
+import os
+import random
+import fire
+
+
+FILES_PER_PACKAGE = 100
+
+
+def python_module(index, imports, methods):
+    lines = [f"import pkg_{dep // FILES_PER_PACKAGE:04d}.mod_{dep:06d}" for dep in imports]
+    lines += ["", "", f"class Component{index}:", f'    """Synthetic component {index}."""', ""]
+    for method in range(methods):
+        lines += [
+            f"    def step_{method}(self, value):",
+            f'        """Step {method} of component {index}."""',
+            f"        total = value * {method + 1}",
+        ]
+        lines += [f"        total += pkg_{dep // FILES_PER_PACKAGE:04d}.mod_{dep:06d}.Component{dep}().step_0(total)"
+                  for dep in imports[:2]]
+        lines += ["        return total", ""]
+
+    return "\n".join(lines) + "\n"
+
+
+def java_class(index, imports, methods):
+    package = f"com.synthetic.p{index // FILES_PER_PACKAGE:04d}"
+    lines = [f"package {package};", ""]
+    lines += [f"import com.synthetic.p{dep // FILES_PER_PACKAGE:04d}.Component{dep};" for dep in imports]
+    lines += ["", f"/** Synthetic component {index}. */", f"public class Component{index} {{"]
+    for method in range(methods):
+        lines += [
+            f"    /** Step {method} of component {index}. */",
+            f"    public int step{method}(int value) {{",
+            f"        int total = value * {method + 1};",
+        ]
+        lines += [f"        total += new Component{dep}().step0(total);" for dep in imports[:2]]
+        lines += ["        return total;", "    }", ""]
+    lines += ["}"]
+
+    return "\n".join(lines) + "\n"
+
+
+def file_path(root, language, index):
+    package = index // FILES_PER_PACKAGE
+    if language == "java":
+        return os.path.join(root, "src", "main", "java", "com", "synthetic", f"p{package:04d}", f"Component{index}.java")
+    return os.path.join(root, f"pkg_{package:04d}", f"mod_{index:06d}.py")
+
+
+def generate_repo(root, files=100, language="python", max_imports=4, methods=6, seed=0):
+    """
+    Write `files` source files under root. Each file imports up to max_imports earlier
+    files, so the graph is acyclic and has leaves to start from. Returns the paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for index in range(files):
+        # mostly nearby files, like real packages, with the odd long edge
+        candidates = range(max(0, index - 200), index)
+        imports = sorted(rng.sample(candidates, min(len(candidates), rng.randint(0, max_imports))))
+
+        path = file_path(root, language, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            if language == "java":
+                f.write(java_class(index, imports, methods))
+            else:
+                f.write(python_module(index, imports, methods))
+        paths.append(path)
+
+    if language == "python":
+        for package in range((files + FILES_PER_PACKAGE - 1) // FILES_PER_PACKAGE):
+            open(os.path.join(root, f"pkg_{package:04d}", "__init__.py"), "w").close()
+
+    return paths
+
+
+if __name__ == '__main__':
+    fire.Fire(generate_repo)
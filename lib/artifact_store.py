@@ -0,0 +1,100 @@
+import os
+import sqlite3
+
+
+class ArtifactStore:
+    """
+    Run-scoped store for intermediate results that roles hand to each other. Messages
+    carry a small handle ({"file", "chunk_ids"}) instead of the chunks themselves, so
+    memory grows with the work in flight rather than with the size of the repository.
+
+    Only the chunk metadata and summaries are kept. The chunk source is never copied,
+    its line range points back into the file.
+    """
+
+    def __init__(self, path=None):
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.path = path or ":memory:"
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                chunk_number INTEGER NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                summary TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_file ON chunks (file, chunk_number)")
+        # artifacts only live for one run
+        self.conn.execute("DELETE FROM chunks")
+        self.conn.commit()
+
+    @staticmethod
+    def chunk_id(file, chunk_number):
+        return f"{file}#{chunk_number}"
+
+    def put_chunks(self, file, chunks):
+        """Store summarized chunks and return the handle to publish instead of them."""
+        rows = [
+            (
+                self.chunk_id(file, chunk["chunk_number"]), file, chunk["chunk_number"],
+                chunk["start_line"], chunk["end_line"], chunk["summary"]
+            )
+            for chunk in chunks
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (chunk_id, file, chunk_number, start_line, end_line, summary) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+
+        return {"file": file, "chunk_ids": [row[0] for row in rows]}
+
+    def get_chunks(self, handle):
+        """The chunks a handle points to, in chunk order, without their source text."""
+        wanted = set(handle["chunk_ids"])
+        rows = self.conn.execute(
+            "SELECT chunk_id, chunk_number, start_line, end_line, summary FROM chunks "
+            "WHERE file = ? ORDER BY chunk_number",
+            (handle["file"],)
+        ).fetchall()
+
+        return [
+            {"chunk_number": chunk_number, "start_line": start_line, "end_line": end_line, "summary": summary}
+            for chunk_id, chunk_number, start_line, end_line, summary in rows
+            if chunk_id in wanted
+        ]
+
+    def discard(self, handle):
+        self.conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in handle["chunk_ids"]])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# one store per run, see set_artifact_store
+_artifact_store = None
+
+
+def set_artifact_store(store):
+    global _artifact_store
+    _artifact_store = store
+
+
+def get_artifact_store():
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_jsonl(path, rows):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    os.replace(tmp_path, path)
+
+
+def results_path_for(requests_path):
+    return requests_path[:-len(".jsonl")] + ".results.jsonl"
+
+
+class LocalBatchProcessor:
+    """
+    Stand-in for a provider batch endpoint that answers every request in process.
+    respond(model, prompt) may be sync or async, the default returns a canned summary.
+    """
+
+    def __init__(self, respond=None):
+        self.respond = respond or self.canned_summary
+
+    @staticmethod
+    def canned_summary(model, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"Summary {digest} produced offline for a {len(prompt)} character prompt."
+
+    async def process(self, requests_path):
+        results = []
+        for request in read_jsonl(requests_path):
+            response = self.respond(request["model"], request["prompt"])
+            if inspect.isawaitable(response):
+                response = await response
+            results.append({"custom_id": request["custom_id"], "response": response})
+
+        results_path = results_path_for(requests_path)
+        write_jsonl(results_path, results)
+        return results_path
+
+
+class ExternalBatchProcessor:
+    """
+    Leaves each batch file for an outside job to submit to a provider batch endpoint,
+    then waits until that job drops the matching .results.jsonl next to it. The job
+    should write the results under another name and rename them, so a half-written
+    file is never picked up.
+    """
+
+    def __init__(self, poll_interval=30.0):
+        self.poll_interval = poll_interval
+
+    async def process(self, requests_path):
+        results_path = results_path_for(requests_path)
+        print(f"Batch written to {requests_path}, waiting for {results_path}")
+
+        while not os.path.exists(results_path):
+            await asyncio.sleep(self.poll_interval)
+
+        return results_path
+
+
+class BatchBroker:
+    """
+    Collects the prompts that concurrently running actions submit. Once submissions
+    have been quiet for `linger` seconds, which happens when every file of the current
+    dependency level is waiting on the model, they are written as one JSONL batch and
+    handed to the processor. Each caller then resumes with its own result.
+
+    Request lines are {"custom_id", "model", "prompt"}. Result lines are
+    {"custom_id", "response"} or {"custom_id", "error"}.
+    """
+
+    def __init__(self, directory, processor, linger=0.5):
+        # one directory per run, so results left over from an earlier run are never read
+        self.directory = os.path.join(directory, time.strftime("run-%Y%m%d-%H%M%S"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.processor = processor
+        self.linger = linger
+
+        self._pending = []
+        self._last_submit = 0.0
+        self._flusher = None
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, model, prompt):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((model, prompt, future))
+        self._last_submit = time.monotonic()
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_when_quiet())
+
+        return await future
+
+    @staticmethod
+    def _cancel(pending):
+        # nobody would ever answer them, callers get the cancellation instead of hanging
+        for _, _, future in pending:
+            future.cancel()
+
+    async def _flush_when_quiet(self):
+        try:
+            while True:
+                idle = time.monotonic() - self._last_submit
+                if idle >= self.linger:
+                    break
+                await asyncio.sleep(self.linger - idle)
+        except asyncio.CancelledError:
+            pending, self._pending = self._pending, []
+            self._flusher = None
+            self._cancel(pending)
+            raise
+
+        pending, self._pending = self._pending, []
+        self._flusher = None
+
+        self.batches += 1
+        self.requests += len(pending)
+        batch_number = self.batches
+        custom_ids = [f"batch-{batch_number:04d}-{i}" for i in range(len(pending))]
+
+        try:
+            results = await self._run_batch(batch_number, custom_ids, pending)
+        except asyncio.CancelledError:
+            self._cancel(pending)
+            raise
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, (_, _, future) in zip(custom_ids, pending):
+            if future.done():
+                continue
+
+            result = results.get(custom_id)
+            if result is None:
+                future.set_exception(KeyError(f"batch results have no entry for {custom_id}"))
+            elif "error" in result:
+                future.set_exception(RuntimeError(f"batch request {custom_id} failed: {result['error']}"))
+            else:
+                future.set_result(result["response"])
+
+    async def _run_batch(self, batch_number, custom_ids, pending):
+        requests_path = os.path.join(self.directory, f"batch_{batch_number:04d}.jsonl")
+        write_jsonl(requests_path, [
+            {"custom_id": custom_id, "model": model, "prompt": prompt}
+            for custom_id, (model, prompt, _) in zip(custom_ids, pending)
+        ])
+        print(f"Submitting batch {batch_number} with {len(pending)} prompts")
+
+        results_path = await self.processor.process(requests_path)
+        return {result["custom_id"]: result for result in read_jsonl(results_path)}
@@ -0,0 +1,142 @@
+class SyntaxChunker:
+    """
+    Splits a source file along its syntax tree. Top-level declarations are packed
+    greedily into chunks of at most max_tokens; a declaration that is too large on its
+    own is split along its children (class members, statements), and only a node with
+    nothing left to split into is cut into overlapping line windows.
+
+    Spans are 0-based inclusive line numbers, chunk() reports them 1-based.
+    """
+
+    def __init__(self, parser, count_tokens, max_tokens, overlap_tokens):
+        self.parser = parser
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def chunk(self, content, tree=None):
+        """
+        (start_line, end_line, text) for every chunk, lines are 1-based and inclusive.
+        A tree parsed earlier from the same content can be passed in to skip parsing.
+        """
+        if not content.strip():
+            return []
+
+        # tree-sitter rows only count '\n', so split on exactly that
+        lines = content.split('\n')
+        if tree is None:
+            tree = self.parser.parse(content.encode('utf8'))
+
+        spans = self._child_spans(tree.root_node.named_children, 0, len(lines) - 1)
+        if not spans:
+            spans = [(0, len(lines) - 1, [])]
+
+        return [
+            (start + 1, end + 1, '\n'.join(lines[start:end + 1]))
+            for start, end in self._pack(spans, lines)
+        ]
+
+    def _tokens(self, lines, start, end):
+        return self.count_tokens('\n'.join(lines[start:end + 1]))
+
+    @staticmethod
+    def _child_spans(children, first, last):
+        """
+        Contiguous line spans over [first, last], one per child. Comments and blank lines
+        between children join the following child, children sharing a line are merged.
+        """
+        spans = []
+        for child in children:
+            start, end = child.start_point[0], child.end_point[0]
+            # a node ending right after a newline reports the next row at column 0
+            if child.end_point[1] == 0 and end > start:
+                end -= 1
+            start, end = max(start, first), min(end, last)
+
+            if spans and start <= spans[-1][1]:
+                prev_start, prev_end, nodes = spans[-1]
+                spans[-1] = (prev_start, max(prev_end, end), nodes + [child])
+            else:
+                spans.append((start, end, [child]))
+
+        contiguous = []
+        for i, (start, end, nodes) in enumerate(spans):
+            start = first if i == 0 else contiguous[-1][1] + 1
+            contiguous.append((start, max(start, end), nodes))
+
+        if contiguous:
+            start, _, nodes = contiguous[-1]
+            contiguous[-1] = (start, last, nodes)
+
+        return contiguous
+
+    def _pack(self, spans, lines):
+        chunks = []
+        current = None
+        current_tokens = 0
+
+        for start, end, nodes in spans:
+            tokens = self._tokens(lines, start, end)
+
+            if tokens > self.max_tokens:
+                pieces = self._split_large(start, end, nodes, lines)
+                if current:
+                    # small leftovers such as a class header ride along with the first piece
+                    if self._tokens(lines, current[0], pieces[0][1]) <= self.max_tokens:
+                        pieces[0] = (current[0], pieces[0][1])
+                    else:
+                        chunks.append(current)
+                    current, current_tokens = None, 0
+                chunks.extend(pieces)
+                continue
+
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append(current)
+                current, current_tokens = None, 0
+
+            current = (current[0], end) if current else (start, end)
+            current_tokens += tokens
+
+        if current:
+            chunks.append(current)
+
+        return chunks
+
+    def _split_large(self, start, end, nodes, lines):
+        # split along the children of the nodes first, e.g. a class header and its body
+        # share a line, so the body's members are what can actually be separated
+        if not any(node.named_child_count for node in nodes):
+            return self._split_lines(start, end, lines)
+
+        children = []
+        for node in nodes:
+            children.extend(node.named_children or [node])
+
+        return self._pack(self._child_spans(children, start, end), lines)
+
+    def _split_lines(self, start, end, lines):
+        """Overlapping windows of whole lines, only used for nodes larger than the budget."""
+        line_tokens = [self.count_tokens(line) for line in lines[start:end + 1]]
+
+        windows = []
+        window_start = start
+        while window_start <= end:
+            window_end = window_start
+            tokens = line_tokens[window_start - start]
+            while window_end < end and tokens + line_tokens[window_end + 1 - start] <= self.max_tokens:
+                window_end += 1
+                tokens += line_tokens[window_end - start]
+
+            windows.append((window_start, window_end))
+            if window_end >= end:
+                break
+
+            # step back over as many trailing lines as fit in the overlap, always moving forward
+            next_start = window_end + 1
+            overlap = 0
+            while next_start - 1 > window_start and overlap + line_tokens[next_start - 1 - start] <= self.overlap_tokens:
+                next_start -= 1
+                overlap += line_tokens[next_start - start]
+            window_start = next_start
+
+        return windows
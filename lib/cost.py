@@ -0,0 +1,65 @@
+class BudgetExceeded(Exception):
+    pass
+
+
+class CostTracker:
+    """
+    Spend of the run in dollars, from the tokens of every model call and the per
+    million token prices in model_configuration.MODEL_PRICES. Once the spend reaches
+    the budget, check() raises BudgetExceeded before any further call is sent.
+    Calls already in flight still finish, so the final spend can overshoot slightly.
+    """
+
+    def __init__(self, prices, budget=None):
+        self.prices = prices
+        self.budget = budget
+        self.spent = 0.0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.exceeded = False
+        self._unpriced = set()
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        price = self.prices.get(model)
+        if price is None:
+            if model not in self._unpriced:
+                self._unpriced.add(model)
+                print(f"Warning: no price known for {model}, its calls do not count against the budget")
+            return 0.0
+
+        return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+    def check(self):
+        if self.budget is not None and self.spent >= self.budget:
+            self.exceeded = True
+            raise BudgetExceeded(f"spent ${self.spent:.2f} of the ${self.budget:.2f} budget")
+
+    def charge(self, model, prompt_tokens, completion_tokens):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.spent += self.cost(model, prompt_tokens, completion_tokens)
+
+    def stats(self):
+        return {
+            "budget": self.budget,
+            "spent": self.spent,
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "exceeded": self.exceeded,
+        }
+
+
+# one tracker per run, see set_cost_tracker, unlimited until a budget is set
+_cost_tracker = CostTracker({})
+
+
+def set_cost_tracker(tracker):
+    global _cost_tracker
+    _cost_tracker = tracker
+
+
+def get_cost_tracker():
+    return _cost_tracker
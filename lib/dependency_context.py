@@ -0,0 +1,140 @@
+import os
+import re
+from functools import lru_cache
+
+from lib.graph_store import referenced_names
+
+
+# words kept when a summary is cut down to a one-line abstract
+ABSTRACT_WORDS = 25
+
+
+def abstract(summary):
+    """First sentence of a summary, capped at ABSTRACT_WORDS words."""
+    first = re.split(r'(?<=[.!?])\s', summary.strip(), maxsplit=1)[0]
+    words = first.split()
+    if len(words) > ABSTRACT_WORDS:
+        return " ".join(words[:ABSTRACT_WORDS]) + " ..."
+
+    return " ".join(words)
+
+
+@lru_cache(maxsize=16384)
+def usage_pattern(dep):
+    names = referenced_names(dep)
+    return re.compile(r'\b(?:' + '|'.join(re.escape(name) for name in sorted(names)) + r')\b')
+
+
+def usage_count(code_text, dep):
+    """How often the file mentions the names a dependency is known by."""
+    return len(usage_pattern(dep).findall(code_text))
+
+
+def gather_dependency_summaries(file, dependency_graph, lookup):
+    """
+    Summaries of the direct dependencies of a file and of their own dependencies,
+    as two dicts. lookup(dep) returns a summary or None when there is none (yet).
+    """
+    direct = {}
+    for dep in dependency_graph.get(file, []):
+        summary = lookup(dep)
+        if summary is not None:
+            direct[dep] = summary
+
+    indirect = {}
+    for dep in dependency_graph.get(file, []):
+        for second in dependency_graph.get(dep, []):
+            if second == file or second in direct or second in indirect:
+                continue
+            if second in dependency_graph.get(file, []):
+                continue
+            summary = lookup(second)
+            if summary is not None:
+                indirect[second] = summary
+
+    return direct, indirect
+
+
+def build_dependency_context(code_text, dependency_summaries, count_tokens, budget, indirect_summaries=None):
+    """
+    Dependency context for a prompt in at most `budget` tokens.
+
+    Direct dependencies are ranked by how often the file uses them. Each gets a one-line
+    abstract first, then the best ranked are upgraded to their full summary while the
+    budget allows, and dependencies of dependencies fill what is left with abstracts.
+    Returns (context, stats) where stats counts what was kept, shortened and dropped.
+    """
+    stats = {"full": 0, "abstract": 0, "dropped": 0, "context_tokens": 0, "dropped_tokens": 0}
+    if not dependency_summaries and not indirect_summaries:
+        return "No dependencies.", stats
+
+    def rank(summaries):
+        usage = {dep: usage_count(code_text, dep) for dep in summaries}
+        return sorted(summaries, key=lambda dep: (-usage[dep], os.path.basename(dep)))
+
+    def line(dep, text):
+        return f"- {os.path.basename(dep)}: {text}\n"
+
+    direct = rank(dependency_summaries or {})
+    indirect = rank(indirect_summaries or {})
+
+    remaining = budget
+    chosen = {}
+
+    # every direct dependency is worth a mention before any of them gets its full summary
+    for dep in direct:
+        text = abstract(dependency_summaries[dep])
+        tokens = count_tokens(line(dep, text))
+        if tokens <= remaining:
+            chosen[dep] = (text, tokens)
+            remaining -= tokens
+
+    for dep in direct:
+        if dep not in chosen:
+            continue
+        summary = dependency_summaries[dep]
+        _, abstract_tokens = chosen[dep]
+        tokens = count_tokens(line(dep, summary))
+        if summary != chosen[dep][0] and tokens - abstract_tokens <= remaining:
+            chosen[dep] = (summary, tokens)
+            remaining -= tokens - abstract_tokens
+
+    chosen_indirect = {}
+    for dep in indirect:
+        text = abstract(indirect_summaries[dep])
+        tokens = count_tokens(line(dep, text))
+        if tokens <= remaining:
+            chosen_indirect[dep] = text
+            remaining -= tokens
+
+    # what a full summary of everything would have cost on top of what was sent
+    for dep in direct:
+        full_tokens = count_tokens(line(dep, dependency_summaries[dep]))
+        if dep not in chosen:
+            stats["dropped"] += 1
+            stats["dropped_tokens"] += full_tokens
+        elif chosen[dep][0] == dependency_summaries[dep]:
+            stats["full"] += 1
+        else:
+            stats["abstract"] += 1
+            stats["dropped_tokens"] += full_tokens - chosen[dep][1]
+
+    for dep in indirect:
+        if dep in chosen_indirect:
+            stats["abstract"] += 1
+        else:
+            stats["dropped"] += 1
+            stats["dropped_tokens"] += count_tokens(line(dep, abstract(indirect_summaries[dep])))
+
+    formatted = ""
+    if chosen:
+        formatted += "This file depends on:\n"
+        formatted += "".join(line(dep, chosen[dep][0]) for dep in direct if dep in chosen)
+    if chosen_indirect:
+        formatted += "Through those, it also relies on:\n"
+        formatted += "".join(line(dep, chosen_indirect[dep]) for dep in indirect if dep in chosen_indirect)
+    if not formatted:
+        formatted = "Dependency summaries were left out to fit the prompt budget.\n"
+
+    stats["context_tokens"] = budget - remaining
+    return formatted, stats
@@ -1,8 +1,13 @@
+import re
 import sys
 from abc import ABC, abstractmethod
 from tree_sitter_languages.core import get_language
 from tree_sitter_languages.core import get_parser
 import os
+from functools import lru_cache
+
+from lib.source_store import get_source_store
+from lib.instrumentation import span
 
 class DependencyParser:
     def __init__(self):
@@ -27,6 +32,38 @@ class DependencyParser:
         return self._parsers[extension].parse_dependencies(file_path, project_root)
 
 
+    def java_index(self, project_root):
+        return self._parsers['.java'].index_for(project_root)
+
+    def use_java_index(self, project_root, index):
+        self._parsers['.java'].set_index(project_root, index)
+
+    def syntax_parser(self, file_path):
+        """The tree-sitter parser for a file's language, None if it has no grammar wired up yet."""
+        extension = os.path.splitext(file_path)[1].lower().strip()
+        return getattr(self._parsers.get(extension), 'parser', None)
+
+
+@lru_cache(maxsize=None)
+def get_dependency_parser():
+    """Shared parser registry, the tree-sitter parsers and compiled queries live for the whole run."""
+    return DependencyParser()
+
+
+# process pool workers, each process warms its own registry once in init_worker
+def init_worker(project_root, java_index=None):
+    parser = get_dependency_parser()
+    # the parent scans the project once and ships the index instead of every worker rescanning
+    if java_index is not None:
+        parser.use_java_index(project_root, java_index)
+
+
+def parse_files(files, project_root):
+    parser = get_dependency_parser()
+    # sorted so the graph does not depend on per-process set ordering
+    return [sorted(parser.find_dependencies(file, project_root)) for file in files]
+
+
 class LanguageParser(ABC):
     def __init__(self):
         self.language = None
@@ -43,24 +80,25 @@ class LanguageParser(ABC):
 
 
 class PythonParser(LanguageParser):
+    QUERY_STRING = """
+        (import_statement 
+            (dotted_name) @import)
+        (import_from_statement
+            module_name: (dotted_name) @from_import)
+    """
+
     def _initialize_parser(self):
         self.language = get_language("python")
         self.parser = get_parser("python")
+        # compiling a query is expensive, do it once per parser instead of once per file
+        self.query = self.language.query(self.QUERY_STRING)
 
     def parse_dependencies(self, file_path, project_root):
-        with open(file_path) as f:
-            tree = self.parser.parse(bytes(f.read(), "utf8"))
-            
-        query_string = """
-            (import_statement 
-                (dotted_name) @import)
-            (import_from_statement
-                module_name: (dotted_name) @from_import)
-        """
-        query = self.language.query(query_string)
+        # the tree is kept for the chunker and the outline of the same file
+        tree = get_source_store().tree(file_path, self.parser)
         
         dependencies = []
-        captures = query.captures(tree.root_node)
+        captures = self.query.captures(tree.root_node)
         for capture in captures:
             node = capture[0]  # capture is a tuple of (node, capture_name)
             import_path = node.text.decode('utf8')
@@ -80,33 +118,33 @@ class PythonParser(LanguageParser):
 
 
 class JavaParser(LanguageParser):
+    QUERY_STRING = """
+        (import_declaration
+            (scoped_identifier) @import)
+        (import_declaration
+            (scoped_identifier 
+                _ @wildcard_import))
+        (import_declaration
+            (scoped_identifier) @static_import)
+        (package_declaration 
+            [(identifier) (scoped_identifier)] @package)
+        (type_identifier) @type_usage
+        (object_creation_expression
+            [(type_identifier) (scoped_type_identifier)] @class_instantiation)
+    """
+
     def _initialize_parser(self):
         self.language = get_language("java")
         self.parser = get_parser("java")
+        self.query = self.language.query(self.QUERY_STRING)
 
     def parse_dependencies(self, file_path, project_root):
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
             tree = self.parser.parse(bytes(content, "utf8"))
-            
-        query_string = """
-            (import_declaration
-                (scoped_identifier) @import)
-            (import_declaration
-                (scoped_identifier 
-                    _ @wildcard_import))
-            (import_declaration
-                (scoped_identifier) @static_import)
-            (package_declaration 
-                [(identifier) (scoped_identifier)] @package)
-            (type_identifier) @type_usage
-            (object_creation_expression
-                [(type_identifier) (scoped_type_identifier)] @class_instantiation)
-        """
-        query = self.language.query(query_string)
         
         dependencies = []
-        captures = query.captures(tree.root_node)
+        captures = self.query.captures(tree.root_node)
         
         # Extract the package of the current file
         current_package = None
@@ -236,34 +274,109 @@ class JavaParser(LanguageParser):
         # now we need to add the file extensions back and return deduplicated copy
         return list(set([os.path.join(package_dir, class_name) + '.java' for class_name in package_deps]))
 
+class JavaProjectIndex:
+    """
+    One-time scan of a project's .java files, mapping fully qualified class names and
+    packages to files so that resolving an import is a dict lookup instead of a walk.
+    """
+    SKIPPED_DIRS = {'.git', 'target', 'build', 'bin', 'out'}
+
+    # directory layouts preferred when the same class exists in several places,
+    # in the order the old path probing tried them
+    SOURCE_LAYOUTS = ['', 'src', os.path.join('src', 'main'), os.path.join('src', 'main', 'java')]
+
+    PACKAGE_PATTERN = re.compile(rb'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+    HEADER_BYTES = 64 * 1024
+
+    def __init__(self, project_root):
+        self.project_root = project_root
+        self.classes = {}   # fully qualified name -> [paths], preferred first
+        self.packages = {}  # package name -> [paths]
+        with span("JavaProjectIndex", "resolver") as scan:
+            self._scan()
+            scan.set(files=sum(len(paths) for paths in self.packages.values()))
+
+    def _scan(self):
+        ranked_classes = {}
+
+        for root, dirs, files in os.walk(self.project_root):
+            # Skip build outputs and VCS directories
+            dirs[:] = [d for d in dirs if d not in self.SKIPPED_DIRS]
+
+            for file in files:
+                if not file.endswith('.java'):
+                    continue
+
+                path = os.path.join(root, file)
+                package = self.read_package(path)
+                class_name = file[:-len('.java')]
+                qualified_name = f"{package}.{class_name}" if package else class_name
+
+                rank = self._layout_rank(root, package)
+                ranked_classes.setdefault(qualified_name, []).append((rank, path))
+                self.packages.setdefault(package, []).append(path)
+
+        for qualified_name, candidates in ranked_classes.items():
+            self.classes[qualified_name] = [path for _, path in sorted(candidates)]
+
+        for package in self.packages:
+            self.packages[package].sort()
+
+    def _layout_rank(self, directory, package):
+        package_path = package.replace('.', os.sep)
+        rel_dir = os.path.relpath(directory, self.project_root)
+        for rank, layout in enumerate(self.SOURCE_LAYOUTS):
+            if os.path.normpath(os.path.join(layout, package_path)) == rel_dir:
+                return rank
+
+        return len(self.SOURCE_LAYOUTS)
+
+    @classmethod
+    def read_package(cls, path):
+        # the package declaration sits right after the license header, no need to read the whole file
+        with open(path, 'rb') as f:
+            header = f.read(cls.HEADER_BYTES)
+
+        match = cls.PACKAGE_PATTERN.search(header)
+        return match.group(1).decode('utf8') if match else ''
+
+    def find_class(self, qualified_name):
+        candidates = self.classes.get(qualified_name)
+        return candidates[0] if candidates else None
+
+    def find_package(self, package_name):
+        return self.packages.get(package_name, [])
+
+
 class JavaParser2:
+    QUERY_STRING = JavaParser.QUERY_STRING + """
+        (import_declaration
+            [(identifier) (scoped_identifier)] @wildcard_package
+            (asterisk))
+    """
+
     def __init__(self):
         self.language = get_language("java")
         self.parser = get_parser("java")
+        self.query = self.language.query(self.QUERY_STRING)
+        self._indexes = {}
 
-    def parse_dependencies(self, file_path, project_root):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            tree = self.parser.parse(bytes(content, "utf8"))
+    def index_for(self, project_root):
+        """Class and package index for a project, built on first use and kept for the run."""
+        if project_root not in self._indexes:
+            self._indexes[project_root] = JavaProjectIndex(project_root)
 
-        query_string = """
-            (import_declaration
-                (scoped_identifier) @import)
-            (import_declaration
-                (scoped_identifier
-                    _ @wildcard_import))
-            (import_declaration
-                (scoped_identifier) @static_import)
-            (package_declaration
-                [(identifier) (scoped_identifier)] @package)
-            (type_identifier) @type_usage
-            (object_creation_expression
-                [(type_identifier) (scoped_type_identifier)] @class_instantiation)
-        """
-        query = self.language.query(query_string)
+        return self._indexes[project_root]
+
+    def set_index(self, project_root, index):
+        self._indexes[project_root] = index
 
+    def parse_dependencies(self, file_path, project_root):
+        tree = get_source_store().tree(file_path, self.parser)
+
+        index = self.index_for(project_root)
         dependencies = []
-        captures = query.captures(tree.root_node)
+        captures = self.query.captures(tree.root_node)
 
         # Extract the package of the current file
         current_package = None
@@ -273,8 +386,8 @@ class JavaParser2:
                 current_package = node.text.decode('utf8')
                 break
 
-        # Determine the directory structure pattern used in this project
-        file_dir = os.path.dirname(file_path)
+        # type names only need to be resolved once per file
+        used_types = set()
 
         for capture in captures:
             node, capture_name = capture
@@ -290,119 +403,46 @@ class JavaParser2:
                 if dependency_path:
                     dependencies.append(dependency_path)
 
-            elif capture_name == "static_import" or capture_name == "wildcard_import":
-                if '.*' in import_path:
-                    # Wildcard import
-                    package_name = import_path.replace('.*', '')
-                    package_dir = self.find_package_dir(package_name, project_root)
-                    if package_dir:
-                        for file in os.listdir(package_dir):
-                            if file.endswith('.java'):
-                                dependencies.append(os.path.join(package_dir, file))
+            elif capture_name == "wildcard_package":
+                # every class of the package, or of the class for static wildcard imports
+                package_files = index.find_package(import_path)
+                if package_files:
+                    dependencies.extend(package_files)
                 else:
-                    # Static import
-                    class_path = '.'.join(import_path.split('.')[:-1])
-                    dependency_path = self.find_dependency_file(class_path, project_root)
+                    dependency_path = self.find_dependency_file(import_path, project_root)
                     if dependency_path:
                         dependencies.append(dependency_path)
 
-        # Deduplicate
-        return list(set(dependencies))
+            elif capture_name == "static_import":
+                # Static import
+                class_path = '.'.join(import_path.split('.')[:-1])
+                dependency_path = self.find_dependency_file(class_path, project_root)
+                if dependency_path:
+                    dependencies.append(dependency_path)
 
-    def find_dependency_file(self, import_path, project_root):
-        """
-        Find a Java file for a given import path by checking multiple common directory patterns.
-        """
-        class_name = import_path.split('.')[-1]
-        package_parts = import_path.split('.')
-        package_path = '/'.join(package_parts[:-1])
-        file_name = f"{class_name}.java"
-
-        # Check common directory patterns
-        patterns = [
-            # Standard pattern
-            os.path.join(project_root, package_path, file_name),
-
-            # With src directory
-            os.path.join(project_root, 'src', package_path, file_name),
-
-            # With src/main
-            os.path.join(project_root, 'src', 'main', package_path, file_name),
-
-            # With src/main/java (Maven convention)
-            os.path.join(project_root, 'src', 'main', 'java', package_path, file_name)
-        ]
-
-        # Check each pattern
-        for pattern in patterns:
-            #print(pattern)
-            if os.path.exists(pattern):
-                return pattern
-
-        # If not found with standard patterns, search the project
-        # (limit depth to reduce computational cost)
-        max_depth = 5
-        for root, dirs, files in os.walk(project_root):
-            # Calculate depth
-            rel_path = os.path.relpath(root, project_root)
-            if rel_path == '.':
-                depth = 0
-            else:
-                depth = len(rel_path.split(os.sep))
-
-            if depth > max_depth:
-                dirs[:] = []  # Stop going deeper
-                continue
+            elif capture_name in ("type_usage", "class_instantiation") and current_package:
+                used_types.add(import_path)
 
-            # Skip build outputs and VCS directories
-            dirs[:] = [d for d in dirs if d not in ['.git', 'target', 'build', 'bin', 'out']]
+        # classes of the same package are used without an import
+        for class_name in used_types:
+            dependency_path = self.find_dependency_file(f"{current_package}.{class_name}", project_root)
+            if dependency_path:
+                dependencies.append(dependency_path)
 
-            # Check if this directory ends with the package path
-            if root.endswith(package_path):
-                potential_path = os.path.join(root, file_name)
-                if os.path.exists(potential_path):
-                    return potential_path
+        # a file is not its own dependency, and wildcard imports can include the file itself
+        dependencies = [dep for dep in dependencies if dep != file_path]
+
+        # Deduplicate
+        return list(set(dependencies))
 
-        return None
+    def find_dependency_file(self, import_path, project_root):
+        """Find the Java file declaring a fully qualified class name."""
+        return self.index_for(project_root).find_class(import_path)
 
     def find_package_dir(self, package_name, project_root):
         """Find the directory for a package."""
-        package_path = package_name.replace('.', '/')
-
-        # Check common patterns
-        patterns = [
-            os.path.join(project_root, package_path),
-            os.path.join(project_root, 'src', package_path),
-            os.path.join(project_root, 'src', 'main', package_path),
-            os.path.join(project_root, 'src', 'main', 'java', package_path)
-        ]
-
-        for pattern in patterns:
-            if os.path.isdir(pattern):
-                return pattern
-
-        # Search the project with depth limit
-        max_depth = 5
-        for root, dirs, files in os.walk(project_root):
-            # Calculate depth
-            rel_path = os.path.relpath(root, project_root)
-            if rel_path == '.':
-                depth = 0
-            else:
-                depth = len(rel_path.split(os.sep))
-
-            if depth > max_depth:
-                dirs[:] = []  # Stop going deeper
-                continue
-
-            # Skip build outputs and VCS directories
-            dirs[:] = [d for d in dirs if d not in ['.git', 'target', 'build', 'bin', 'out']]
-
-            # Check if this is our package directory
-            if root.endswith(package_path):
-                return root
-
-        return None
+        package_files = self.index_for(project_root).find_package(package_name)
+        return os.path.dirname(package_files[0]) if package_files else None
 
 def main():
     finder = DependencyParser()
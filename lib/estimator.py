@@ -0,0 +1,226 @@
+from functools import lru_cache
+
+from lib.dependency_context import build_dependency_context, gather_dependency_summaries
+
+
+# summaries are not known before the run, these are typical lengths for the prompts' limits
+EXPECTED_COMPLETION_TOKENS = {
+    "SummarizeChunks": 80,          # no longer than 3 sentences
+    "CombineChunkSummaries": 110,   # no longer than 4 sentences
+    "FileSummarizer": 300,
+}
+
+# rough figures for a hosted model, only used to project wall-clock time
+CALL_OVERHEAD_SECONDS = 1.0
+INPUT_TOKENS_PER_SECOND = 5000
+OUTPUT_TOKENS_PER_SECOND = 80
+
+SENTENCE_WORDS = 20
+
+
+@lru_cache(maxsize=256)
+def placeholder_summary(tokens):
+    """Stand-in text of about `tokens` tokens, in sentences so abstracts behave as usual."""
+    words = ["summary"] * max(1, tokens)
+    sentences = [
+        " ".join(words[i:i + SENTENCE_WORDS]) + "."
+        for i in range(0, len(words), SENTENCE_WORDS)
+    ]
+    return " ".join(sentences)
+
+
+def call_seconds(prompt_tokens, completion_tokens):
+    return (
+        CALL_OVERHEAD_SECONDS
+        + prompt_tokens / INPUT_TOKENS_PER_SECOND
+        + completion_tokens / OUTPUT_TOKENS_PER_SECOND
+    )
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s" if hours else f"{minutes}m {seconds:02d}s"
+
+
+class RunEstimator:
+    """
+    Counts the prompts and tokens a run would send without calling a model. Chunks,
+    code sections and dependency context are built by the real actions, only the
+    summaries they would have produced are replaced by placeholders of typical length.
+    Assumes nothing is cached yet.
+    """
+
+    def __init__(self, chunk_action, combine_action, file_action, prices, router=None):
+        self.chunk_action = chunk_action
+        self.combine_action = combine_action
+        self.file_action = file_action
+        self.prices = prices
+        self.router = router  # a lib.router.ModelRouter, prompts are priced at their tier's model
+
+        self.actions = {}
+        # per stage: the summed model time of every call and the time of the longest chain
+        self.stages = {
+            stage: {"calls": 0, "tokens": 0, "call_seconds": 0.0, "critical_path_seconds": 0.0}
+            for stage in ("chunk summaries", "combine", "final summaries")
+        }
+
+    def count_tokens(self, action, text):
+        return len(action._tokenize(text))
+
+    def add_call(self, action, stage, prompt_tokens, context_tokens=0, file=None):
+        completion_tokens = EXPECTED_COMPLETION_TOKENS[action.name]
+        tier = self.router.route(action.name, prompt_tokens, file) if self.router else None
+        model = tier.model if tier else action.config.llm.model
+        price = self.prices.get(model)
+        cost = 0.0
+        if price:
+            cost = (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+        totals = self.actions.setdefault(action.name, {
+            "models": {}, "calls": 0, "prompt_tokens": 0,
+            "completion_tokens": 0, "context_tokens": 0, "cost": 0.0
+        })
+        totals["models"][model] = totals["models"].get(model, 0) + 1
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["context_tokens"] += context_tokens
+        totals["cost"] += cost
+
+        seconds = call_seconds(prompt_tokens, completion_tokens)
+        self.stages[stage]["calls"] += 1
+        self.stages[stage]["tokens"] += prompt_tokens + completion_tokens
+        self.stages[stage]["call_seconds"] += seconds
+        return seconds
+
+    def dependency_context(self, action, file, dependency_graph, lookup):
+        direct, indirect = gather_dependency_summaries(file, dependency_graph, lookup)
+        context, stats = build_dependency_context(
+            action.get_code_text(file),
+            direct,
+            lambda text: self.count_tokens(action, text),
+            action.context_budget,
+            indirect
+        )
+        return context, stats["context_tokens"]
+
+    def estimate_chunks(self, file, dependency_graph, chunk_counts):
+        action = self.chunk_action
+
+        def lookup(dep):
+            # the chunk stage sees the joined chunk summaries of its dependencies
+            if dep not in chunk_counts:
+                return None
+            return placeholder_summary(chunk_counts[dep] * EXPECTED_COMPLETION_TOKENS[action.name])
+
+        context, context_tokens = self.dependency_context(action, file, dependency_graph, lookup)
+        chunks = action.create_chunks(file)
+        chunk_counts[file] = len(chunks)
+
+        # a file's chunks are summarized concurrently, the file takes as long as its slowest chunk
+        longest = 0.0
+        for chunk in chunks:
+            prompt = action.PROMPT_TEMPLATE.format(code_text=chunk["content"], dependency_summaries=context)
+            seconds = self.add_call(
+                action, "chunk summaries", self.count_tokens(action, prompt), context_tokens, file
+            )
+            longest = max(longest, seconds)
+
+        return longest
+
+    def estimate_combine(self, file, chunk_count):
+        """Follows CombineChunkSummaries' tree reduction, returns (seconds, combined summary tokens)."""
+        action = self.combine_action
+        template_tokens = self.count_tokens(action, action.COMBINE_SUMMARIES_PROMPT.format(summaries=""))
+
+        sizes = [EXPECTED_COMPLETION_TOKENS["SummarizeChunks"]] * chunk_count
+        seconds = 0.0
+        while len(sizes) > 1:
+            groups = [sizes[i:i + action.COMBINE_FANOUT] for i in range(0, len(sizes), action.COMBINE_FANOUT)]
+            level_seconds = 0.0
+            next_sizes = []
+            for group in groups:
+                if len(group) == 1:
+                    next_sizes.append(group[0])
+                    continue
+                seconds_for_call = self.add_call(action, "combine", template_tokens + sum(group), file=file)
+                level_seconds = max(level_seconds, seconds_for_call)
+                next_sizes.append(EXPECTED_COMPLETION_TOKENS[action.name])
+
+            seconds += level_seconds
+            sizes = next_sizes
+
+        return seconds, sizes[0] if sizes else 0
+
+    def estimate_final(self, file, dependency_graph, combined_tokens):
+        action = self.file_action
+
+        def lookup(dep):
+            # the final stage sees the combined summaries of its dependencies
+            if dep not in combined_tokens:
+                return None
+            return placeholder_summary(combined_tokens[dep])
+
+        context, context_tokens = self.dependency_context(action, file, dependency_graph, lookup)
+        prompt = action.FILE_SUMMARY_PROMPT.format(
+            file_summary=placeholder_summary(combined_tokens[file]),
+            code_sections=action.extract_key_code_sections(file),
+            dependency_context=context
+        )
+        return self.add_call(action, "final summaries", self.count_tokens(action, prompt), context_tokens, file)
+
+    def estimate(self, dependency_graph, processing_order):
+        chunk_counts = {}
+        chunk_finish = {}
+        for file in processing_order:
+            seconds = self.estimate_chunks(file, dependency_graph, chunk_counts)
+            # a file starts once all of its dependencies are summarized
+            start = max((chunk_finish.get(dep, 0.0) for dep in dependency_graph.get(file, [])), default=0.0)
+            chunk_finish[file] = start + seconds
+
+        combined_tokens = {}
+        for file in processing_order:
+            seconds, combined_tokens[file] = self.estimate_combine(file, chunk_counts[file])
+            self.stages["combine"]["critical_path_seconds"] = max(
+                self.stages["combine"]["critical_path_seconds"], seconds
+            )
+
+        for file in processing_order:
+            seconds = self.estimate_final(file, dependency_graph, combined_tokens)
+            self.stages["final summaries"]["critical_path_seconds"] = max(
+                self.stages["final summaries"]["critical_path_seconds"], seconds
+            )
+
+        self.stages["chunk summaries"]["critical_path_seconds"] = max(chunk_finish.values(), default=0.0)
+
+        total = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+        for totals in self.actions.values():
+            for key in total:
+                total[key] += totals[key]
+
+        return {
+            "files": len(processing_order),
+            "chunks": sum(chunk_counts.values()),
+            "actions": self.actions,
+            "stages": self.stages,
+            "total": total,
+        }
+
+
+def project_time(estimate, concurrency, requests_per_second=None, tokens_per_minute=None):
+    """
+    Wall-clock seconds of the staged pipeline at a given number of requests in flight.
+    Every stage takes at least its longest dependency chain, its model time spread
+    over the concurrency, and whatever the provider rate limits allow for its calls.
+    """
+    seconds = 0.0
+    for stage in estimate["stages"].values():
+        stage_seconds = max(stage["call_seconds"] / max(1, concurrency), stage["critical_path_seconds"])
+        if requests_per_second:
+            stage_seconds = max(stage_seconds, stage["calls"] / requests_per_second)
+        if tokens_per_minute:
+            stage_seconds = max(stage_seconds, stage["tokens"] / tokens_per_minute * 60)
+        seconds += stage_seconds
+
+    return seconds
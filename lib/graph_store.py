@@ -0,0 +1,152 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+from functools import lru_cache
+
+
+# bump whenever the artifact layout or the way dependencies are resolved changes,
+# older artifacts are then ignored and the graph is rebuilt from scratch
+GRAPH_VERSION = 1
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def file_record(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": file_hash(path)}
+
+
+def save_graph(path, project_root, dependency_graph, records):
+    """
+    Write the graph as gzipped JSON with paths relative to project_root, together
+    with the mtime, size and content hash each file had when it was parsed.
+    """
+    files = {}
+    for file, deps in dependency_graph.items():
+        rel_file = os.path.relpath(file, project_root)
+        files[rel_file] = dict(records[file], deps=[os.path.relpath(dep, project_root) for dep in deps])
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # write then rename so a crash never leaves a truncated artifact behind
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump({"version": GRAPH_VERSION, "files": files}, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_graph(path, project_root):
+    """
+    Load a saved graph as (dependency_graph, records) keyed by paths joined onto
+    project_root. Returns (None, None) when there is no usable artifact.
+    """
+    if not os.path.exists(path):
+        return None, None
+
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+
+    if data.get("version") != GRAPH_VERSION:
+        return None, None
+
+    dependency_graph = {}
+    records = {}
+    for rel_file, entry in data["files"].items():
+        file = os.path.join(project_root, rel_file)
+        dependency_graph[file] = [os.path.join(project_root, dep) for dep in entry["deps"]]
+        records[file] = {key: entry[key] for key in ("mtime_ns", "size", "sha256")}
+
+    return dependency_graph, records
+
+
+@lru_cache(maxsize=16384)
+def referenced_names(file):
+    """
+    Names other files would have to mention to import or use this one. Looked up once
+    per file, every file that depends on it asks again when its context is ranked.
+    """
+    names = {os.path.splitext(os.path.basename(file))[0]}
+    if file.endswith('.java'):
+        # wildcard imports mention the package, not the class
+        from lib.dependency_parser import JavaProjectIndex
+        package = JavaProjectIndex.read_package(file)
+        if package:
+            names.add(package)
+
+    return frozenset(names)
+
+
+def plan_update(files, dependency_graph, records):
+    """
+    Compare the current files against a saved graph. Returns the files that have to be
+    re-parsed, the dependencies that can be reused as is, and fresh records for all files.
+
+    An edited Java file that moves to another package is not propagated to the files
+    that used it under its old name, run with --rebuild-graph after such moves.
+    """
+    current = set(files)
+    removed = set(dependency_graph) - current
+    added = [file for file in files if file not in dependency_graph]
+
+    reparse = set(added)
+    reused = {}
+    new_records = {}
+
+    for file in files:
+        if file in reparse:
+            continue
+
+        old = records[file]
+        stat = os.stat(file)
+        if stat.st_mtime_ns == old["mtime_ns"] and stat.st_size == old["size"]:
+            new_records[file] = old
+            reused[file] = dependency_graph[file]
+            continue
+
+        # touched but not edited, e.g. by a checkout, only the hash tells
+        record = file_record(file)
+        new_records[file] = record
+        if record["sha256"] == old["sha256"]:
+            reused[file] = dependency_graph[file]
+        else:
+            reparse.add(file)
+
+    # a removed file simply disappears from the edges of the files that imported it
+    if removed:
+        for file, deps in reused.items():
+            if any(dep in removed for dep in deps):
+                reused[file] = [dep for dep in deps if dep not in removed]
+
+    # a new file can satisfy imports that did not resolve before, only files that
+    # mention one of its names can have gained an edge
+    if added:
+        names = set()
+        for file in added:
+            names |= referenced_names(file)
+        pattern = re.compile(b'|'.join(re.escape(name.encode('utf8')) for name in sorted(names)))
+
+        for file in list(reused):
+            with open(file, 'rb') as f:
+                if pattern.search(f.read()):
+                    reparse.add(file)
+                    del reused[file]
+
+    for file in reparse:
+        if file not in new_records:
+            new_records[file] = file_record(file)
+
+    return [file for file in files if file in reparse], reused, new_records
@@ -0,0 +1,83 @@
+import os
+import subprocess
+from collections import deque
+
+
+def _git(project_root, *args):
+    result = subprocess.run(
+        ["git", "-C", project_root, *args],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+
+    return result.stdout
+
+
+def changed_files(project_root, since):
+    """
+    Absolute paths of files that differ from the given git revision, including
+    uncommitted edits and untracked files that are not ignored.
+    """
+    toplevel = _git(project_root, "rev-parse", "--show-toplevel").strip()
+
+    changed = _git(project_root, "diff", "--name-only", since, "--").splitlines()
+    untracked = _git(project_root, "ls-files", "--others", "--exclude-standard", "--full-name").splitlines()
+
+    return {os.path.realpath(os.path.join(toplevel, path)) for path in changed + untracked if path}
+
+
+def reverse_dependency_index(dependency_graph):
+    """Map every project file to the project files that depend on it."""
+    dependents = {file: [] for file in dependency_graph}
+    for file, deps in dependency_graph.items():
+        for dep in deps:
+            if dep in dependents:
+                dependents[dep].append(file)
+
+    return dependents
+
+
+def stale_files(dependency_graph, changed, previous_graph=None):
+    """
+    Files whose summaries are out of date: the changed files themselves plus every
+    file that transitively depends on one, since its dependency context changed.
+
+    Deleted or renamed files are gone from the current graph, so with the previous
+    (saved) graph their former importers are found through its edges. Files whose
+    own dependencies differ from the previous graph are stale as well.
+    """
+    dependents = reverse_dependency_index(dependency_graph)
+
+    # graph keys are paths as collected by the splitter, changes come back absolute
+    by_real_path = {os.path.realpath(file): file for file in dependency_graph}
+    seeds = {by_real_path[path] for path in changed if path in by_real_path}
+
+    if previous_graph is not None:
+        previous = {
+            os.path.realpath(file): {os.path.realpath(dep) for dep in deps}
+            for file, deps in previous_graph.items()
+        }
+
+        removed = set(previous) - set(by_real_path)
+        for path, deps in previous.items():
+            if path in by_real_path and deps & removed:
+                seeds.add(by_real_path[path])
+
+        for path, file in by_real_path.items():
+            deps = {os.path.realpath(dep) for dep in dependency_graph[file]}
+            if previous.get(path) != deps:
+                seeds.add(file)
+
+    queue = deque(seeds)
+    stale = set(seeds)
+
+    while queue:
+        file = queue.popleft()
+        for dependent in dependents[file]:
+            if dependent not in stale:
+                stale.add(dependent)
+                queue.append(dependent)
+
+    return stale
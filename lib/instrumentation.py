@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+
+
+class Span:
+    """One timed operation. Attributes can be added while it runs, numbers are summed in the report."""
+    __slots__ = ("tracer", "name", "category", "attrs", "start", "lane")
+
+    def __init__(self, tracer, name, category, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = None
+        self.lane = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.lane = self.tracer.lane()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.tracer.finish(self, time.perf_counter(), error)
+        return False
+
+
+class Tracer:
+    """
+    Collects spans around role turns, action runs, llm and embedding calls. Every span
+    is folded into per (category, name) totals right away. The raw events are only
+    kept when a Chrome trace was asked for, so long runs do not grow without bound.
+    """
+
+    def __init__(self, keep_events=False):
+        self.keep_events = keep_events
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+
+        self._totals = {}
+        self._events = []
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, category, **attrs):
+        return Span(self, name, category, attrs)
+
+    def lane(self):
+        # concurrent tasks get their own row in the trace viewer
+        try:
+            key = id(asyncio.current_task())
+        except RuntimeError:
+            key = ("thread", threading.get_ident())
+
+        with self._lock:
+            return self._lanes.setdefault(key, len(self._lanes))
+
+    def finish(self, span, end, error):
+        duration = end - span.start
+        with self._lock:
+            totals = self._totals.setdefault(
+                (span.category, span.name),
+                {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            totals["count"] += 1
+            totals["total_seconds"] += duration
+            totals["max_seconds"] = max(totals["max_seconds"], duration)
+            if error is not None:
+                totals["errors"] += 1
+
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+
+            if self.keep_events:
+                self._events.append((span.name, span.category, span.start, duration, span.lane, dict(span.attrs)))
+
+    def report(self):
+        wall = time.perf_counter() - self.started
+        categories = {}
+        with self._lock:
+            for (category, name), totals in sorted(self._totals.items()):
+                entry = dict(totals, mean_seconds=totals["total_seconds"] / totals["count"])
+                categories.setdefault(category, {})[name] = entry
+
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": wall,
+            "categories": categories,
+        }
+
+    def write_report(self, path, **extra):
+        report = dict(self.report(), **extra)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+    def write_chrome_trace(self, path):
+        """Trace Event Format, opens in chrome://tracing and Perfetto."""
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start - self.started) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": lane,
+                    "args": attrs,
+                }
+                for name, category, start, duration, lane, attrs in self._events
+            ]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+# one tracer per run, see set_tracer
+_tracer = Tracer()
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer():
+    return _tracer
+
+
+def span(name, category, **attrs):
+    return _tracer.span(name, category, **attrs)
+
+
+def traced(category):
+    """Wrap an async method of a role or action in a span named after self.name."""
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            attrs = {}
+            # per-file actions take the file first, it makes the trace searchable
+            if args and isinstance(args[0], str) and os.path.sep in args[0]:
+                attrs["file"] = args[0]
+
+            with _tracer.span(self.name, category, **attrs):
+                return await method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
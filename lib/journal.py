@@ -0,0 +1,156 @@
+import os
+import json
+import asyncio
+import threading
+
+from lib.graph_store import file_hash
+from lib.incremental import stale_files
+
+
+class RunJournal:
+    """
+    Append-only JSONL log of every summary the moment it is produced. Each record is
+    fsync'd before the call returns, so after a crash, e.g. a call that ran out of
+    retries, --resume replays the journal and only the unfinished work is paid for again.
+
+    Records are {"stage": "chunks", "file", "sha256", "chunks"}, {"stage": "combined" or
+    "final", "file", "sha256", "summary"}, {"stage": "indexed", "files"} once a batch of
+    final summaries is in the vector store, and {"stage": "discarded", "files"} for stale
+    summaries a resumed run has to redo. Chunks are kept without their source text.
+    """
+    STAGES = ("chunks", "combined", "final")
+
+    def __init__(self, path, resume=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.entries = {stage: {} for stage in self.STAGES}
+        self.indexed = set()
+        self.changed = set()  # files edited since they were journaled
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self._replay()
+
+        # a run that does not resume starts a new journal
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if self.changed:
+            self._append({"stage": "discarded", "files": sorted(self.changed)})
+
+    def _replay(self):
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                # a crash mid-write leaves at most one torn record at the end
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+
+                valid_bytes += len(line)
+                if record["stage"] == "indexed":
+                    self.indexed.update(record["files"])
+                elif record["stage"] == "discarded":
+                    self.discard(record["files"])
+                else:
+                    self.entries[record["stage"]][record["file"]] = record
+
+        # new records must not be appended to a torn one
+        os.truncate(self.path, valid_bytes)
+
+        # summaries of files edited since then are stale, they are made again
+        journaled = {file for entries in self.entries.values() for file in entries}
+        for file in journaled:
+            sha256 = self.entries["chunks"].get(file, {}).get("sha256")
+            if not os.path.exists(file) or sha256 != self.file_hash(file):
+                self.changed.add(file)
+        self.discard(self.changed)
+
+    def file_hash(self, file):
+        if file not in self._hashes:
+            self._hashes[file] = file_hash(file)
+        return self._hashes[file]
+
+    def discard(self, files):
+        for file in files:
+            for entries in self.entries.values():
+                entries.pop(file, None)
+            self.indexed.discard(file)
+
+    def invalidate(self, dependency_graph, previous_graph=None):
+        """Drop the summaries of files depending on an edited file, their dependency context changed."""
+        # with the graph saved by the interrupted run, deleted files are caught too
+        if not self.changed and previous_graph is None:
+            return
+
+        stale = stale_files(dependency_graph, {os.path.realpath(file) for file in self.changed}, previous_graph)
+        if not stale:
+            return
+        self.discard(stale)
+        # a later resume must not bring them back
+        self._append({"stage": "discarded", "files": sorted(stale)})
+
+    def get(self, stage, file):
+        """The journaled chunks or summary of a file, None when the stage has to run."""
+        record = self.entries[stage].get(file)
+        if record is None:
+            return None
+        return record["chunks"] if stage == "chunks" else record["summary"]
+
+    def _append(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+        # outside the lock, concurrent writers share one fsync
+        os.fsync(self._file.fileno())
+
+    async def write(self, record):
+        # hashing and fsync block, keep them off the event loop
+        def append():
+            if "file" in record:
+                record["sha256"] = self.file_hash(record["file"])
+            self._append(record)
+
+        await asyncio.to_thread(append)
+
+    async def record_chunks(self, file, chunks):
+        await self.write({
+            "stage": "chunks",
+            "file": file,
+            "chunks": [{key: value for key, value in chunk.items() if key != "content"} for chunk in chunks],
+        })
+
+    async def record_summary(self, stage, file, summary):
+        await self.write({"stage": stage, "file": file, "summary": summary})
+
+    async def record_indexed(self, files):
+        await self.write({"stage": "indexed", "files": list(files)})
+
+    def describe(self):
+        return (
+            f"{len(self.entries['chunks'])} chunked, {len(self.entries['combined'])} combined, "
+            f"{len(self.entries['final'])} final and {len(self.indexed)} indexed files, "
+            f"{len(self.changed)} files edited since"
+        )
+
+    def close(self):
+        self._file.close()
+
+
+# one journal per run, disabled until set_run_journal is called
+_run_journal = None
+
+
+def set_run_journal(journal):
+    global _run_journal
+    _run_journal = journal
+
+
+def get_run_journal():
+    return _run_journal
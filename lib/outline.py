@@ -0,0 +1,152 @@
+import os
+import re
+from functools import lru_cache
+
+from lib.dependency_parser import get_dependency_parser
+from lib.source_store import get_source_store
+
+
+# node types that declare something worth listing, and the containers holding members
+PYTHON_DECLARATIONS = {'class_definition': 'class', 'function_definition': 'def'}
+JAVA_DECLARATIONS = {
+    'class_declaration': 'class',
+    'interface_declaration': 'interface',
+    'enum_declaration': 'enum',
+    'record_declaration': 'record',
+    'annotation_type_declaration': 'annotation',
+    'method_declaration': 'method',
+    'constructor_declaration': 'constructor',
+}
+JAVA_MEMBER_CONTAINERS = {'class_body', 'interface_body', 'enum_body', 'enum_body_declarations', 'annotation_type_body'}
+
+DOCSTRING_PATTERN = re.compile(r'^[rRuUbBfF]*("""|\'\'\'|"|\')(.*)\1$', re.DOTALL)
+DOC_CHARACTERS = 200
+
+
+def _signature(node):
+    """Declaration text up to its body, whitespace collapsed onto one line."""
+    # python headers end at their colon, comments after it are not part of the signature
+    colon = next((child for child in node.children if child.type == ':'), None)
+    body = node.child_by_field_name('body')
+    if colon is not None:
+        end = colon.end_byte
+    elif body is not None:
+        end = body.start_byte
+    else:
+        end = node.end_byte
+
+    text = node.text[:end - node.start_byte].decode('utf8', errors='replace')
+    return ' '.join(text.split()).rstrip(';')
+
+
+def _first_paragraph(text):
+    paragraph = text.strip().split('\n\n')[0]
+    paragraph = ' '.join(paragraph.split())
+    if len(paragraph) > DOC_CHARACTERS:
+        return paragraph[:DOC_CHARACTERS].rstrip() + ' ...'
+    return paragraph
+
+
+def _python_docstring(node):
+    body = node.child_by_field_name('body')
+    if body is None or not body.named_children:
+        return None
+
+    first = body.named_children[0]
+    if first.type != 'expression_statement' or not first.named_children or first.named_children[0].type != 'string':
+        return None
+
+    match = DOCSTRING_PATTERN.match(first.named_children[0].text.decode('utf8', errors='replace'))
+    return _first_paragraph(match.group(2)) if match else None
+
+
+def _javadoc(node):
+    comment = node.prev_named_sibling
+    if comment is None or comment.type not in ('block_comment', 'comment'):
+        return None
+
+    text = comment.text.decode('utf8', errors='replace')
+    if not text.startswith('/**'):
+        return None
+
+    lines = [line.strip().lstrip('*').strip() for line in text[3:-2].split('\n')]
+    # tags such as @param and @return repeat the signature
+    lines = [line for line in lines if not line.startswith('@')]
+    return _first_paragraph('\n'.join(lines))
+
+
+def _entry(node, kind, depth, docstring):
+    return {
+        'kind': kind,
+        'name': (node.child_by_field_name('name').text.decode('utf8', errors='replace')
+                 if node.child_by_field_name('name') is not None else ''),
+        'signature': _signature(node),
+        'docstring': docstring,
+        'start_line': node.start_point[0] + 1,
+        'end_line': node.end_point[0] + 1,
+        'depth': depth,
+    }
+
+
+def _python_outline(node, depth, entries):
+    for child in node.named_children:
+        if child.type == 'decorated_definition':
+            child = child.child_by_field_name('definition')
+        if child is None or child.type not in PYTHON_DECLARATIONS:
+            continue
+
+        entries.append(_entry(child, PYTHON_DECLARATIONS[child.type], depth, _python_docstring(child)))
+        # members of classes are listed, the insides of functions are not
+        if child.type == 'class_definition':
+            body = child.child_by_field_name('body')
+            if body is not None:
+                _python_outline(body, depth + 1, entries)
+
+
+def _java_outline(node, depth, entries):
+    for child in node.named_children:
+        if child.type in JAVA_MEMBER_CONTAINERS:
+            _java_outline(child, depth, entries)
+            continue
+        if child.type not in JAVA_DECLARATIONS:
+            continue
+
+        entries.append(_entry(child, JAVA_DECLARATIONS[child.type], depth, _javadoc(child)))
+        body = child.child_by_field_name('body')
+        if body is not None and body.type in JAVA_MEMBER_CONTAINERS:
+            _java_outline(body, depth + 1, entries)
+
+
+OUTLINERS = {'.py': _python_outline, '.java': _java_outline}
+
+
+@lru_cache(maxsize=4096)
+def get_outline(path):
+    """
+    Classes, functions and methods of a file as dicts with kind, name, signature,
+    docstring, 1-based start_line/end_line and nesting depth, in source order.
+    None for languages without an outliner. Computed once per file from the tree
+    the dependency parser already put in the source store.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    parser = get_dependency_parser().syntax_parser(path)
+    if extension not in OUTLINERS or parser is None:
+        return None
+
+    entries = []
+    OUTLINERS[extension](get_source_store().tree(path, parser).root_node, 0, entries)
+    return entries
+
+
+def format_outline(entries, max_entries):
+    lines = []
+    for entry in entries[:max_entries]:
+        indent = '    ' * entry['depth']
+        lines.append(f"{indent}{entry['signature']}  [lines {entry['start_line']}-{entry['end_line']}]")
+        if entry['docstring']:
+            lines.append(f"{indent}    {entry['docstring']}")
+
+    if len(entries) > max_entries:
+        lines.append(f"... {len(entries) - max_entries} more declarations")
+
+    return '\n'.join(lines)
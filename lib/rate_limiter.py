@@ -0,0 +1,192 @@
+import time
+import random
+import asyncio
+
+
+def is_overload_error(error):
+    """Errors that mean the provider is saturated, the call is retried at a lower concurrency."""
+    message = str(error).lower()
+    return "overloaded_error" in message or "rate_limit" in message
+
+
+def is_transport_error(error):
+    """Dropped connections, they say nothing about the provider's load and are simply retried."""
+    message = str(error)
+    return "RemoteProtocolError" in message or "closed connection" in message or "httpx" in message
+
+
+def retry_delay(attempt, base_delay=1.0, max_delay=30.0):
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    # jitter for rl
+    return delay + delay * 0.2 * (random.random() * 2 - 1)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # units refilled per second
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount):
+        # requests larger than the bucket would never fit, they only wait for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    """
+    Provider-wide pacing for one model: token buckets on requests per second and
+    tokens per minute, plus an AIMD limit on concurrent requests. Overload errors halve
+    the limit and pause every caller for a cooldown that doubles while overloads keep
+    coming; each success grows the limit back by about one request per round trip.
+    """
+
+    def __init__(
+        self,
+        max_concurrency,
+        requests_per_second=None,
+        tokens_per_minute=None,
+        min_concurrency=1,
+        decrease_factor=0.5,
+        base_cooldown=5.0,
+        max_cooldown=120.0
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+
+        self.requests = TokenBucket(requests_per_second, requests_per_second) if requests_per_second else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.consecutive_overloads = 0
+        self._waiters = []
+
+        self.total_requests = 0
+        self.total_overloads = 0
+        self.total_wait = 0.0
+
+    def _delay(self, now, tokens):
+        delays = [self.paused_until - now]
+        if self.requests:
+            self.requests.refill(now)
+            delays.append(self.requests.delay_for(1))
+        if self.tokens:
+            self.tokens.refill(now)
+            delays.append(self.tokens.delay_for(tokens))
+
+        return max(0.0, *delays)
+
+    async def acquire(self, tokens=0):
+        """Wait for a request slot, returns the seconds spent waiting."""
+        start = time.monotonic()
+
+        # single event loop, nothing can interleave between the check and the update
+        while True:
+            delay = self._delay(time.monotonic(), tokens)
+            if delay == 0 and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(tokens)
+
+                waited = time.monotonic() - start
+                self.total_wait += waited
+                return waited
+
+            if delay == 0:
+                # only concurrency is exhausted, a release wakes us up
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                await waiter
+            else:
+                await asyncio.sleep(delay)
+
+    def release(self, overloaded=False, failed=False, completion_tokens=0):
+        """Return a slot. Successes grow the limit, overloads shrink it, other failures leave it."""
+        self.in_flight -= 1
+        self.total_requests += 1
+
+        # completion tokens are only known afterwards, they are paid as debt
+        if self.tokens and completion_tokens:
+            self.tokens.refill(time.monotonic())
+            self.tokens.level -= completion_tokens
+
+        if overloaded:
+            self._decrease()
+        elif not failed:
+            self.consecutive_overloads = 0
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _decrease(self):
+        now = time.monotonic()
+        self.total_overloads += 1
+
+        # concurrent calls failing in the same burst only count once
+        if now < self.paused_until:
+            return
+
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self.consecutive_overloads))
+        # jitter for rl
+        cooldown += cooldown * 0.2 * (random.random() * 2 - 1)
+        self.paused_until = now + cooldown
+        self.consecutive_overloads += 1
+
+    def stats(self):
+        return {
+            "concurrency_limit": int(self.limit),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "requests_per_second": self.requests.rate if self.requests else None,
+            "tokens_per_minute": self.tokens.capacity if self.tokens else None,
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+            "requests": self.total_requests,
+            "overloads": self.total_overloads,
+            "wait_seconds": self.total_wait,
+        }
+
+
+# one limiter per model, shared by every action that talks to it
+_limits = {"max_concurrency": 1, "requests_per_second": None, "tokens_per_minute": None}
+_model_limits = {}
+_limiters = {}
+
+
+def configure_rate_limits(**limits):
+    """Defaults for limiters created from now on."""
+    _limits.update(limits)
+
+
+def configure_model_limits(model, **limits):
+    """Limits of one model that override the defaults, e.g. the concurrency of a routing tier."""
+    _model_limits.setdefault(model, {}).update(limits)
+
+
+def get_rate_limiter(model):
+    if model not in _limiters:
+        _limiters[model] = AdaptiveRateLimiter(**dict(_limits, **_model_limits.get(model, {})))
+
+    return _limiters[model]
+
+
+def all_rate_limiters():
+    return dict(_limiters)
@@ -0,0 +1,108 @@
+from lib.outline import get_outline
+
+
+# tiers from cheapest to most capable
+TIERS = ["small", "medium", "large"]
+
+# the tiers each action may use, merging summaries never needs the large model
+ACTION_TIERS = {
+    "SummarizeChunks": ("small", "large"),
+    "CombineChunkSummaries": ("small", "medium"),
+    "FileSummarizer": ("small", "large"),
+}
+
+
+class ModelTier:
+    def __init__(self, name, model, llm):
+        self.name = name
+        self.model = model
+        self.llm = llm
+
+
+def parse_assignments(spec, cast=str):
+    """'small=phi4,large=haiku' -> {"small": "phi4", "large": "haiku"}"""
+    if isinstance(spec, dict):
+        return {name: cast(value) for name, value in spec.items()}
+
+    assignments = {}
+    for part in str(spec).split(","):
+        if part.strip():
+            name, value = part.split("=", 1)
+            assignments[name.strip()] = cast(value.strip())
+    return assignments
+
+
+class ModelRouter:
+    """
+    Picks a model tier for every prompt. Small prompts from simple files (few
+    declarations, hardly used by other files) go to the small tier, large prompts and
+    hub files that many others import go to the large tier, the rest to the medium one.
+    The choice is then kept within the range the action allows, and a tier that was
+    not configured falls through to the nearest one, preferring the more capable.
+    """
+
+    def __init__(self, tiers, small_max_tokens=1500, large_min_tokens=6000, hub_dependents=10,
+                 simple_max_declarations=8):
+        self.tiers = tiers  # tier name -> ModelTier
+        self.small_max_tokens = small_max_tokens
+        self.large_min_tokens = large_min_tokens
+        self.hub_dependents = hub_dependents
+        self.simple_max_declarations = simple_max_declarations
+
+        self._dependents = {}  # file -> number of project files importing it
+        self.routed = {name: 0 for name in TIERS}
+
+    def add_file(self, file, dependencies):
+        """Count the imports of a parsed file, files can be added while a streaming run is underway."""
+        for dep in set(dependencies):
+            if dep != file:
+                self._dependents[dep] = self._dependents.get(dep, 0) + 1
+
+    def index_graph(self, dependency_graph):
+        for file, deps in dependency_graph.items():
+            self.add_file(file, deps)
+
+    def complexity(self, file):
+        outline = get_outline(file) if file else None
+        return {
+            "dependents": self._dependents.get(file, 0),
+            "declarations": len(outline) if outline is not None else None,
+        }
+
+    def choose(self, action_name, prompt_tokens, file=None):
+        """The tier name for a prompt, before falling through to configured tiers."""
+        complexity = self.complexity(file)
+        declarations = complexity["declarations"]
+
+        if prompt_tokens >= self.large_min_tokens or complexity["dependents"] >= self.hub_dependents:
+            tier = "large"
+        elif (
+            prompt_tokens <= self.small_max_tokens
+            and complexity["dependents"] <= 1
+            and (declarations is None or declarations <= self.simple_max_declarations)
+        ):
+            tier = "small"
+        else:
+            tier = "medium"
+
+        lowest, highest = ACTION_TIERS.get(action_name, (TIERS[0], TIERS[-1]))
+        index = min(max(TIERS.index(tier), TIERS.index(lowest)), TIERS.index(highest))
+        return TIERS[index]
+
+    def route(self, action_name, prompt_tokens, file=None):
+        """The configured ModelTier a prompt goes to."""
+        wanted = TIERS.index(self.choose(action_name, prompt_tokens, file))
+        # more capable tiers first, then the cheaper ones
+        for index in list(range(wanted, len(TIERS))) + list(range(wanted - 1, -1, -1)):
+            tier = self.tiers.get(TIERS[index])
+            if tier is not None:
+                self.routed[tier.name] += 1
+                return tier
+
+        return None
+
+    def describe(self):
+        return ", ".join(
+            f"{name} ({self.tiers[name].model}): {self.routed[name]} prompts"
+            for name in TIERS if name in self.tiers
+        )
@@ -0,0 +1,215 @@
+import os
+import re
+import time
+
+
+class GitignoreRules:
+    """
+    Patterns of one .gitignore file, matched against paths relative to its directory.
+    Covers what projects use in practice: comments, negation, directory-only patterns,
+    anchoring, and the *, ?, [...] and ** wildcards.
+    """
+
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            if line.startswith('\\'):
+                line = line[1:]
+
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+
+            # a slash anywhere but at the end ties the pattern to this directory
+            anchored = '/' in line
+            line = line.lstrip('/')
+
+            regex = self._translate(line)
+            if not anchored:
+                regex = r'(?:.*/)?' + regex
+            self.rules.append((re.compile(regex), negated, directory_only))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return cls(f.readlines())
+
+    @staticmethod
+    def _translate(pattern):
+        regex = ''
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                regex += r'(?:.*/)?'
+                i += 3
+            elif pattern.startswith('**', i):
+                regex += r'.*'
+                i += 2
+            elif pattern[i] == '*':
+                regex += r'[^/]*'
+                i += 1
+            elif pattern[i] == '?':
+                regex += r'[^/]'
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 1)
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex += '[' + body.replace('\\', '\\\\') + ']'
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+
+        return regex
+
+    def match(self, relative_path, is_dir):
+        """True or False when a pattern decides, None when no pattern applies."""
+        decision = None
+        for regex, negated, directory_only in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.fullmatch(relative_path):
+                decision = not negated
+
+        return decision
+
+
+class ProjectScanner:
+    """
+    Finds the source files of a project. Ignored directories and .gitignore matches are
+    pruned during the walk, extensions are looked up in a suffix set, and oversized,
+    generated and binary files are skipped from their size, name and first bytes
+    before anything else reads them.
+    """
+    IGNORED_DIRS = {
+        '.git', '.hg', '.svn', '.codestallation', 'node_modules', 'target', 'build', 'dist',
+        'out', '__pycache__', '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache',
+        '.gradle', '.idea', '.eggs',
+    }
+    GENERATED_SUFFIXES = ('_pb2.py', '_pb2_grpc.py', '.pb.go', '.min.js', '.generated.java')
+    # markers code generators leave near the top of a file
+    GENERATED_MARKER = re.compile(rb'@generated|do not edit|auto-?generated|code generated by', re.IGNORECASE)
+    HEADER_BYTES = 8192
+    MARKER_BYTES = 1024
+
+    def __init__(self, root, file_extensions, max_file_size=1_000_000, use_gitignore=True):
+        self.root = root
+        self.suffixes = {'.' + ext.lower().lstrip('.') for ext in file_extensions}
+        self.max_file_size = max_file_size
+        self.use_gitignore = use_gitignore
+        self.stats = {}
+
+    def _ignored(self, path, is_dir, gitignores):
+        # the closest .gitignore that has an opinion wins
+        for directory, rules in reversed(gitignores):
+            decision = rules.match(os.path.relpath(path, directory).replace(os.sep, '/'), is_dir)
+            if decision is not None:
+                return decision
+
+        return False
+
+    def _skip_reason(self, path, name, size):
+        if self.max_file_size and size > self.max_file_size:
+            return "large"
+        if name.endswith(self.GENERATED_SUFFIXES):
+            return "generated"
+
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(self.HEADER_BYTES)
+        except OSError:
+            return "unreadable"
+
+        if b'\0' in header:
+            return "binary"
+        if self.GENERATED_MARKER.search(header[:self.MARKER_BYTES]):
+            return "generated"
+
+        return None
+
+    def scan(self):
+        """Yield matching file paths, directory by directory in sorted order."""
+        start = time.monotonic()
+        stats = {
+            "directories": 0, "pruned_directories": 0, "files_seen": 0, "files": 0,
+            "gitignored": 0, "large": 0, "generated": 0, "binary": 0, "unreadable": 0,
+        }
+        self.stats = stats
+
+        # (directory, gitignore rules inherited by it), depth first
+        stack = [(self.root, [])]
+        while stack:
+            directory, gitignores = stack.pop()
+            stats["directories"] += 1
+
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+
+            if self.use_gitignore and any(entry.name == '.gitignore' for entry in entries):
+                try:
+                    rules = GitignoreRules.from_file(os.path.join(directory, '.gitignore'))
+                    gitignores = gitignores + [(directory, rules)]
+                except OSError:
+                    pass
+
+            subdirectories = []
+            for entry in entries:
+                # symlinked directories are not followed, they can loop
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in self.IGNORED_DIRS or self._ignored(entry.path, True, gitignores):
+                        stats["pruned_directories"] += 1
+                    else:
+                        subdirectories.append(entry.path)
+                    continue
+
+                stats["files_seen"] += 1
+                if os.path.splitext(entry.name)[1].lower() not in self.suffixes:
+                    continue
+                if not entry.is_file():
+                    continue
+                if gitignores and self._ignored(entry.path, False, gitignores):
+                    stats["gitignored"] += 1
+                    continue
+
+                reason = self._skip_reason(entry.path, entry.name, entry.stat().st_size)
+                if reason:
+                    stats[reason] += 1
+                    continue
+
+                stats["files"] += 1
+                yield entry.path
+
+            # reversed so the stack pops subdirectories in sorted order
+            stack.extend((path, gitignores) for path in reversed(subdirectories))
+
+        stats["seconds"] = time.monotonic() - start
+        stats["files_per_second"] = stats["files_seen"] / stats["seconds"] if stats["seconds"] else 0.0
+
+    def collect(self):
+        return list(self.scan())
+
+    def describe(self):
+        stats = self.stats
+        skipped = ", ".join(
+            f"{stats[reason]} {reason}" for reason in ("gitignored", "large", "generated", "binary", "unreadable")
+            if stats[reason]
+        )
+        return (
+            f"Scanned {stats['files_seen']} files in {stats['directories']} directories "
+            f"({stats['pruned_directories']} pruned) in {stats['seconds']:.2f}s, "
+            f"{stats['files_per_second']:.0f} files/sec: {stats['files']} to summarize"
+            + (f", skipped {skipped}" if skipped else "")
+        )
@@ -0,0 +1,240 @@
+import asyncio
+
+
+class DependencyScheduler:
+    """
+    Wavefront scheduler over the project dependency graph.
+
+    A file is released as soon as every in-project dependency that precedes it in
+    processing_order is done. Edges pointing forward in processing_order only exist
+    inside cycles and are ignored, which breaks cycles exactly the way
+    BuildDependencyGraph.determine_processing_order does.
+    """
+
+    def __init__(self, dependency_graph, processing_order):
+        self.processing_order = list(processing_order)
+        self._position = {file: i for i, file in enumerate(self.processing_order)}
+
+        # file -> dependencies it has to wait for, and the reverse direction
+        self._dependencies = {}
+        self._dependents = {file: [] for file in self.processing_order}
+
+        for file in self.processing_order:
+            deps = sorted(
+                {dep for dep in dependency_graph.get(file, []) if self._precedes(dep, file)},
+                key=self._position.get
+            )
+            self._dependencies[file] = deps
+            for dep in deps:
+                self._dependents[dep].append(file)
+
+        self._levels = None
+
+    def _precedes(self, dep, file):
+        return dep in self._position and self._position[dep] < self._position[file]
+
+    def dependencies(self, file):
+        return self._dependencies.get(file, [])
+
+    def dependents(self, file):
+        return self._dependents.get(file, [])
+
+    def levels(self):
+        """Group files into antichains, level n only depends on levels < n."""
+        if self._levels is None:
+            level_of = {}
+            levels = []
+            # processing_order is topological, so dependencies always have a level already
+            for file in self.processing_order:
+                level = 1 + max((level_of[dep] for dep in self._dependencies[file]), default=-1)
+                level_of[file] = level
+                if level == len(levels):
+                    levels.append([])
+                levels[level].append(file)
+            self._levels = levels
+
+        return self._levels
+
+    def level_widths(self):
+        return [len(level) for level in self.levels()]
+
+    def critical_path_length(self):
+        return len(self.levels())
+
+    def describe(self):
+        widths = self.level_widths()
+        critical_path = self.critical_path_length()
+
+        return {
+            "files": len(self.processing_order),
+            "levels": critical_path,
+            "level_widths": widths,
+            "max_width": max(widths, default=0),
+            "critical_path_length": critical_path,
+            # upper bound on the speedup over one file at a time
+            "average_parallelism": len(self.processing_order) / critical_path if critical_path else 0.0,
+        }
+
+    async def run(self, worker, max_concurrency=1):
+        """
+        Await worker(file) for every file, releasing each one as soon as its
+        dependencies have finished. A failing worker cancels the remaining files.
+        """
+        remaining = {file: len(deps) for file, deps in self._dependencies.items()}
+        slots = asyncio.Semaphore(max(1, max_concurrency))
+
+        async with asyncio.TaskGroup() as group:
+            async def run_file(file):
+                async with slots:
+                    await worker(file)
+
+                for dependent in self._dependents[file]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        group.create_task(run_file(dependent))
+
+            for file in self.processing_order:
+                if remaining[file] == 0:
+                    group.create_task(run_file(file))
+
+
+def depth_first_order(graph):
+    """
+    Dependencies before dependents, like BuildDependencyGraph.determine_processing_order,
+    but iterative so long import chains cannot hit the recursion limit.
+    """
+    order = []
+    visited = set()
+
+    for root in graph:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(graph[root]))]
+        while stack:
+            file, deps = stack[-1]
+            for dep in deps:
+                if dep in graph and dep not in visited:
+                    visited.add(dep)
+                    stack.append((dep, iter(graph[dep])))
+                    break
+            else:
+                stack.pop()
+                order.append(file)
+
+    return order
+
+
+class StreamingScheduler:
+    """
+    Scheduler for a dependency graph that is still being discovered. Files are added
+    with their dependencies as they are parsed and released once every dependency is
+    done, so leaf files can be summarized while the rest of the project is still being
+    scanned. A dependency that was not added yet is waited for until close() says no
+    more files are coming; dependencies that never showed up are then dropped and the
+    remaining cycles are broken the same way DependencyScheduler breaks them.
+
+    add() blocks while `capacity` files are waiting or ready, which keeps the parsing
+    stage from running far ahead of the summarizers. It only lets more files in when
+    nothing can run until further files are known.
+
+    Ready files are handed to the workers through a queue, so a release wakes one
+    worker. The condition is only waited on by add() for the back-pressure.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = max(1, capacity)
+        self.dependency_graph = {}
+
+        self._waiting = {}  # file -> dependencies that are not done yet
+        self._dependents = {}
+        self._ready = asyncio.Queue()  # files, then None once every file has been handed out
+        self._running = set()
+        self._done = set()
+        self._closed = False
+        self._finished = False
+        self._changed = asyncio.Condition()
+
+        self.max_pending = 0
+
+    def _pending(self):
+        return len(self._waiting) + self._ready.qsize()
+
+    def _release(self, file):
+        del self._waiting[file]
+        self._ready.put_nowait(file)
+
+    def _finish_if_complete(self):
+        # every file is queued ahead of the sentinel, workers pass it on to each other
+        if self._closed and not self._waiting and not self._finished:
+            self._finished = True
+            self._ready.put_nowait(None)
+
+    async def add(self, file, dependencies):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: self._pending() < self.capacity or (self._ready.empty() and not self._running)
+            )
+
+            self.dependency_graph[file] = list(dependencies)
+            waiting = {dep for dep in dependencies if dep != file and dep not in self._done}
+            self._waiting[file] = waiting
+            for dep in waiting:
+                self._dependents.setdefault(dep, set()).add(file)
+
+            if not waiting:
+                self._release(file)
+
+            self.max_pending = max(self.max_pending, self._pending())
+            self._changed.notify_all()
+
+    async def close(self):
+        """No more files will be added."""
+        async with self._changed:
+            self._closed = True
+
+            for file, waiting in self._waiting.items():
+                waiting.intersection_update(self.dependency_graph)
+
+            # files still waiting on each other form cycles, the depth-first order decides
+            # which edge of a cycle is ignored
+            order = depth_first_order({file: sorted(waiting) for file, waiting in self._waiting.items()})
+            position = {file: i for i, file in enumerate(order)}
+            for file in order:
+                self._waiting[file] = {
+                    dep for dep in self._waiting[file]
+                    if dep not in position or position[dep] < position[file]
+                }
+                if not self._waiting[file]:
+                    self._release(file)
+
+            self._finish_if_complete()
+            self._changed.notify_all()
+
+    async def next(self):
+        """The next file whose dependencies are done, None once every file has been handed out."""
+        file = await self._ready.get()
+        if file is None:
+            self._ready.put_nowait(None)
+            return None
+
+        self._running.add(file)
+        # only add() waits on the condition, for room below the capacity
+        async with self._changed:
+            self._changed.notify_all()
+        return file
+
+    async def done(self, file):
+        async with self._changed:
+            self._running.discard(file)
+            self._done.add(file)
+
+            for dependent in self._dependents.pop(file, ()):
+                waiting = self._waiting.get(dependent)
+                if waiting is not None and file in waiting:
+                    waiting.discard(file)
+                    if not waiting:
+                        self._release(dependent)
+
+            self._finish_if_complete()
+            self._changed.notify_all()
@@ -0,0 +1,140 @@
+import os
+import mmap
+import threading
+from collections import OrderedDict
+
+
+class SourceFile:
+    """One file's raw bytes, decoded text and, once asked for, its tree-sitter tree."""
+
+    def __init__(self, path, data, mapped):
+        self.path = path
+        self.data = data  # bytes, or an mmap for files of MMAP_THRESHOLD bytes and more
+        self.mapped = mapped
+        self.size = len(data)
+        self._text = None
+        self.tree = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            # utf-8-sig drops a leading BOM, undecodable bytes must not fail a whole run
+            self._text = bytes(self.data).decode('utf-8-sig', errors='replace')
+        return self._text
+
+    def weight(self):
+        # rough bytes held in memory, mapped pages belong to the os page cache
+        weight = 0 if self.mapped else self.size
+        if self._text is not None:
+            weight += self.size
+        if self.tree is not None:
+            weight += self.size
+        return weight
+
+    def parse(self, parser):
+        if self.tree is None:
+            # a tree keeps the bytes it was parsed from for node.text, parsed through a
+            # read callback it has none, so mapped files are parsed from a copy
+            self.tree = parser.parse(bytes(self.data) if self.mapped else self.data)
+        return self.tree
+
+
+class SourceStore:
+    """
+    Per-run cache of source files shared by every stage. Each file is read once,
+    files over MMAP_THRESHOLD bytes are memory-mapped, and the decoded text and parse
+    tree are kept with it. Least recently used files are evicted once the entries
+    weigh more than max_bytes. Safe to use from the executor threads that parse.
+    """
+    # below the scanner's default --max-file-size of 1 MB, so large sources do get mapped
+    MMAP_THRESHOLD = 256 << 10
+
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()
+        self._weight = 0
+        self._lock = threading.RLock()
+
+        self.reads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= self.MMAP_THRESHOLD:
+                # the mapping stays valid after the file is closed
+                return SourceFile(path, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), True)
+            return SourceFile(path, f.read(), False)
+
+    def get(self, path):
+        with self._lock:
+            source = self._files.get(path)
+            if source is not None:
+                self.hits += 1
+                self._files.move_to_end(path)
+                return source
+
+            source = self._read(path)
+            self.reads += 1
+            self._files[path] = source
+            self._weight += source.weight()
+            self._evict()
+            return source
+
+    def _update(self, source, before):
+        # text and trees are added lazily, so an entry's weight grows after it is stored
+        self._weight += source.weight() - before
+        self._evict()
+
+    def _evict(self):
+        # the newest entry always stays, a caller is about to use it
+        while self._weight > self.max_bytes and len(self._files) > 1:
+            _, source = self._files.popitem(last=False)
+            self._weight -= source.weight()
+            self.evictions += 1
+
+    def text(self, path):
+        with self._lock:
+            source = self.get(path)
+            before = source.weight()
+            text = source.text
+            if path in self._files:
+                self._update(source, before)
+            return text
+
+    def tree(self, path, parser):
+        with self._lock:
+            source = self.get(path)
+            before = source.weight()
+            tree = source.parse(parser)
+            if path in self._files:
+                self._update(source, before)
+            return tree
+
+    def stats(self):
+        requests = self.reads + self.hits
+        return {
+            "files": len(self._files),
+            "bytes": self._weight,
+            "reads": self.reads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
+
+
+# one store per run, see set_source_store
+_source_store = None
+
+
+def set_source_store(store):
+    global _source_store
+    _source_store = store
+
+
+def get_source_store():
+    global _source_store
+    if _source_store is None:
+        _source_store = SourceStore()
+    return _source_store
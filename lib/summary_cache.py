@@ -0,0 +1,105 @@
+import os
+import time
+import hashlib
+import sqlite3
+
+
+class SummaryCache:
+    """
+    Persistent summary cache shared across runs.
+
+    Entries are keyed by a hash over the action name, model name, prompt template and
+    the hashes of everything substituted into the prompt (code text, dependency
+    summaries, chunk summaries). Any change to one of those parts is a miss.
+
+    The latest summary of each file per stage is kept as well, so incremental runs
+    can use the summaries of unaffected files as dependency context.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_summaries (
+                path TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (path, stage)
+            )
+            """
+        )
+        self.conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    @staticmethod
+    def make_key(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            # hash each part separately so ("ab", "c") and ("a", "bc") differ
+            digest.update(SummaryCache.content_hash(str(part)).encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, kind, summary):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries (key, kind, summary, created) VALUES (?, ?, ?, ?)",
+            (key, kind, summary, time.time())
+        )
+        self.conn.commit()
+
+    def put_file_summary(self, file, stage, summary):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO file_summaries (path, stage, summary, updated) VALUES (?, ?, ?, ?)",
+            (os.path.realpath(file), stage, summary, time.time())
+        )
+        self.conn.commit()
+
+    def get_file_summary(self, file, stage):
+        row = self.conn.execute(
+            "SELECT summary FROM file_summaries WHERE path = ? AND stage = ?",
+            (os.path.realpath(file), stage)
+        ).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
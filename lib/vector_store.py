@@ -0,0 +1,394 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from lib.instrumentation import span
+
+
+class VectorStore(ABC):
+    """Where final summaries are embedded and stored for retrieval."""
+
+    @abstractmethod
+    def embed(self, texts, input_type="passage"):
+        """Embed a batch of texts, returns one list of floats per text."""
+        pass
+
+    @abstractmethod
+    def upsert(self, records, namespace):
+        """Insert or overwrite records of the form {"id", "values", "metadata"}."""
+        pass
+
+    @abstractmethod
+    def query(self, vector, top_k=10, namespace=None):
+        """The top_k closest records as {"id", "score", "metadata"}, best first."""
+        pass
+
+    def close(self):
+        pass
+
+
+class PineconeVectorStore(VectorStore):
+    EMBEDDING_MODEL = "llama-text-embed-v2"
+
+    def __init__(self, api_key, index_name="codestallation"):
+        # imported here so air-gapped machines can run without the pinecone client
+        from pinecone import Pinecone
+
+        self.pc = Pinecone(api_key=api_key)
+        self.index = self.pc.Index(index_name)
+
+    def embed(self, texts, input_type="passage"):
+        embeddings = self.pc.inference.embed(
+            model=self.EMBEDDING_MODEL,
+            inputs=texts,
+            parameters={"input_type": input_type}
+        )
+        return [embedding["values"] for embedding in embeddings]
+
+    def upsert(self, records, namespace):
+        self.index.upsert(vectors=records, namespace=namespace)
+
+    def query(self, vector, top_k=10, namespace=None):
+        result = self.index.query(vector=vector, top_k=top_k, namespace=namespace, include_metadata=True)
+        return [
+            {"id": match["id"], "score": match["score"], "metadata": match.get("metadata") or {}}
+            for match in result["matches"]
+        ]
+
+
+class BufferedUpserter:
+    """
+    Buffers summaries and embeds and upserts them in batches through one store.
+    A batch is written once it holds batch_size summaries, once the oldest buffered
+    summary has waited flush_interval seconds, or when flush is called explicitly.
+    on_write, if given, is awaited with the ids of every batch once it is stored.
+    A batch that fails in the background is re-raised from the next add or flush.
+    """
+
+    def __init__(self, store, namespace, batch_size=96, flush_interval=30.0, max_retries=10, base_delay=5,
+                 on_write=None):
+        self.store = store
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.on_write = on_write
+
+        self._buffer = []
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._error = None  # failure of a timed flush, nobody awaits the timer task
+
+    def _raise_background_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def add(self, record_id, text, metadata=None):
+        self._raise_background_error()
+        self._buffer.append((record_id, text, metadata or {"text": text}))
+
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self._error = e
+
+    async def flush(self):
+        self._raise_background_error()
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+
+        async with self._lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                self._buffer = self._buffer[self.batch_size:]
+                await self._write(batch)
+
+    async def _write(self, batch):
+        texts = [text if text.strip() else "no summary was produced by the model" for _, text, _ in batch]
+
+        with span("write_batch", "vector_store", records=len(batch), store=type(self.store).__name__) as write:
+            for attempt in range(self.max_retries):
+                try:
+                    # the clients are blocking, keep them off the event loop
+                    with span("embed", "embedding", texts=len(texts)):
+                        embeddings = await asyncio.to_thread(self.store.embed, texts, "passage")
+                    records = [
+                        {"id": record_id, "values": values, "metadata": metadata}
+                        for (record_id, _, metadata), values in zip(batch, embeddings)
+                    ]
+                    with span("upsert", "vector_store", records=len(records)):
+                        await asyncio.to_thread(self.store.upsert, records, self.namespace)
+                    break
+                except Exception:
+                    # last attempt on exp backoff
+                    if attempt == self.max_retries - 1:
+                        raise
+
+                    delay = self.base_delay * (2 ** attempt)
+
+                    # jitter for rl
+                    jitter = delay * 0.2 * (random.random() * 2 - 1)
+                    wait_time = delay + jitter
+
+                    write.add("retries", 1)
+                    write.add("backoff_seconds", wait_time)
+                    print(f"Vector store unavailable, retrying batch of {len(batch)} in {wait_time:.2f} seconds (attempt {attempt+1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+
+        if self.on_write is not None:
+            await self.on_write([record_id for record_id, _, _ in batch])
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for an embedding model: identifiers and words are hashed
+    into a fixed number of signed buckets. Texts sharing vocabulary end up close,
+    which is enough for offline search and for tests.
+    """
+    TOKEN_PATTERN = re.compile(r"[A-Za-z][a-z]*|[A-Z]+(?![a-z])|\d+")
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def tokens(self, text):
+        # camelCase and snake_case identifiers contribute their parts as well
+        return [token.lower() for token in self.TOKEN_PATTERN.findall(text)]
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in self.tokens(text):
+                digest = hashlib.blake2b(token.encode("utf8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimension
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+
+        return vectors.tolist()
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded vector store for machines without network access. Every namespace is a
+    memory-mapped float32 matrix of unit vectors plus an append-only JSONL sidecar
+    holding ids and metadata. Search is brute force, or IVF once build_ivf has been called.
+    """
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, directory, embedder=None, dimension=384):
+        self.directory = directory
+        self.embedder = embedder or HashingEmbedder(dimension)
+        self.dimension = dimension
+        self._namespaces = {}
+
+    def embed(self, texts, input_type="passage"):
+        return self.embedder(texts)
+
+    def _namespace(self, namespace):
+        namespace = namespace or "default"
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = _LocalNamespace(
+                os.path.join(self.directory, namespace), self.dimension, self.INITIAL_CAPACITY
+            )
+
+        return self._namespaces[namespace]
+
+    def upsert(self, records, namespace):
+        self._namespace(namespace).upsert(records)
+
+    def query(self, vector, top_k=10, namespace=None):
+        return self._namespace(namespace).query(vector, top_k)
+
+    def build_ivf(self, namespace=None, n_lists=None, n_probe=8):
+        self._namespace(namespace).build_ivf(n_lists, n_probe)
+
+    def close(self):
+        for namespace in self._namespaces.values():
+            namespace.close()
+        self._namespaces = {}
+
+
+class _LocalNamespace:
+    def __init__(self, directory, dimension, initial_capacity):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.header_path = os.path.join(directory, "records.json")
+        # one {"id", "metadata"} line per upserted record, the last line of an id wins
+        self.records_path = os.path.join(directory, "records.jsonl")
+
+        self.ids = []
+        self.metadata = []
+        self.rows = {}
+
+        if os.path.exists(self.header_path):
+            with open(self.header_path, encoding="utf-8") as f:
+                header = json.load(f)
+            if header["dimension"] != dimension:
+                raise ValueError(
+                    f"{directory} holds {header['dimension']}-dimensional vectors, not {dimension}"
+                )
+            self.capacity = header["capacity"]
+            legacy = list(zip(header.get("ids", []), header.get("metadata", [])))
+        else:
+            self.capacity = initial_capacity
+            legacy = []
+
+        self.dimension = dimension
+        if legacy:
+            # stores written before records.jsonl kept every record in the header, move them over
+            with open(self.records_path, "w", encoding="utf-8") as f:
+                f.write("".join(
+                    json.dumps({"id": record_id, "metadata": metadata}) + "\n" for record_id, metadata in legacy
+                ))
+        self._replay_records()
+        self._write_header()
+        self.matrix = self._open_matrix()
+        self.ivf = None
+
+    def _set_record(self, record_id, metadata):
+        row = self.rows.get(record_id)
+        if row is None:
+            row = len(self.ids)
+            self.rows[record_id] = row
+            self.ids.append(record_id)
+            self.metadata.append(metadata)
+        else:
+            self.metadata[row] = metadata
+        return row
+
+    def _replay_records(self):
+        if not os.path.exists(self.records_path):
+            return
+
+        valid_bytes = 0
+        with open(self.records_path, "rb") as f:
+            for line in f:
+                # a crash mid-append leaves at most one torn line at the end
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+                self._set_record(record["id"], record["metadata"])
+
+        # new lines must not be appended to a torn one
+        os.truncate(self.records_path, valid_bytes)
+
+    def _write_header(self):
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self.header_path)
+
+    def _open_matrix(self):
+        size = self.capacity * self.dimension * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+
+    def _grow(self, needed):
+        self.matrix.flush()
+        del self.matrix
+        while self.capacity < needed:
+            self.capacity *= 2
+        self.matrix = self._open_matrix()
+        self._write_header()
+
+    def upsert(self, records):
+        new_count = len(self.ids) + sum(1 for record in records if record["id"] not in self.rows)
+        if new_count > self.capacity:
+            self._grow(new_count)
+
+        for record in records:
+            vector = np.asarray(record["values"], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            # unit vectors turn cosine similarity into a dot product
+            vector = vector / norm if norm else vector
+
+            row = self._set_record(record["id"], record.get("metadata") or {})
+            self.matrix[row] = vector
+
+        # vectors first, a record line never points at a row that was not written
+        self.matrix.flush()
+        with open(self.records_path, "a", encoding="utf-8") as f:
+            f.write("".join(
+                json.dumps({"id": record["id"], "metadata": record.get("metadata") or {}}) + "\n"
+                for record in records
+            ))
+
+        # lists are stale now, search falls back to brute force until rebuilt
+        self.ivf = None
+
+    def build_ivf(self, n_lists=None, n_probe=8, iterations=10):
+        count = len(self.ids)
+        if count == 0:
+            return
+
+        vectors = np.asarray(self.matrix[:count])
+        n_lists = min(n_lists or max(1, int(np.sqrt(count))), count)
+
+        # plain k-means, seeded for reproducible lists
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(count, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = vectors[assignment == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[i] = centroid / norm if norm else centroid
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        lists = [np.flatnonzero(assignment == i) for i in range(n_lists)]
+        self.ivf = (centroids, lists, min(n_probe, n_lists))
+
+    def query(self, vector, top_k):
+        count = len(self.ids)
+        if count == 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+
+        if self.ivf is None:
+            candidates = np.arange(count)
+        else:
+            centroids, lists, n_probe = self.ivf
+            probed = np.argsort(-(centroids @ query))[:n_probe]
+            candidates = np.concatenate([lists[i] for i in probed])
+
+        scores = np.asarray(self.matrix[candidates]) @ query
+        top_k = min(top_k, len(candidates))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        return [
+            {"id": self.ids[candidates[i]], "score": float(scores[i]), "metadata": self.metadata[candidates[i]]}
+            for i in best
+        ]
+
+    def close(self):
+        self.matrix.flush()
+        del self.matrix
@@ -1,18 +1,37 @@
+import os
 import fire
 import typer
 from metagpt.logs import logger
 from metagpt.team import Team
+from metagpt.utils.common import NoMoneyException
 from metagpt.roles.di.data_interpreter import DataInterpreter
 from metagpt.tools.libs import repository_parser
 from metagpt.strategy.task_type import TaskType
-from model_configuration import get_chatgpt, get_claude, get_phi4, get_no_model, get_tinyllama
+from metagpt.provider.llm_provider_registry import create_llm_instance
+from model_configuration import get_chatgpt, get_claude, get_phi4, get_no_model, get_tinyllama, MODEL_PRICES, MODEL_CONFIGS
+from actions import (
+    set_max_inflight, set_summary_cache, set_batch_broker, set_model_router,
+    SplitProject, BuildDependencyGraph, SummarizeChunks, CombineChunkSummaries, FileSummarizer
+)
+from lib.summary_cache import SummaryCache
+from lib.source_store import SourceStore, set_source_store, get_source_store
+from lib.artifact_store import ArtifactStore, set_artifact_store
+from lib.vector_store import PineconeVectorStore, LocalVectorStore
+from lib.rate_limiter import configure_rate_limits, configure_model_limits, all_rate_limiters
+from lib.batch import BatchBroker, LocalBatchProcessor, ExternalBatchProcessor
+from lib.instrumentation import Tracer, set_tracer
+from lib.cost import CostTracker, set_cost_tracker
+from lib.journal import RunJournal, set_run_journal
+from lib.router import ModelRouter, ModelTier, TIERS, parse_assignments
+from lib.estimator import RunEstimator, project_time, format_duration
 
 from agents import (
     ProjectSplitter, 
     DependencyGraphBuilder, 
     ChunkSummarizer, 
     ChunkSummaryCombiner, 
-    FileLevelSummarizer
+    FileLevelSummarizer,
+    StreamingSummarizer
 )
 
 #phi4 = get_phi4()
@@ -23,40 +42,286 @@ no_model = get_no_model()
 
 app = typer.Typer()
 
+
+def build_router(route, tier_inflight, max_inflight):
+    """ModelRouter over the tiers of --route, each behind its own concurrency limit."""
+    models = parse_assignments(route)
+    inflight = parse_assignments(tier_inflight or {}, int)
+
+    unknown = [name for name in list(models) + list(inflight) if name not in TIERS]
+    if unknown:
+        raise ValueError(f"unknown tiers {', '.join(unknown)}, expected {', '.join(TIERS)}")
+    unknown = [model for model in models.values() if model not in MODEL_CONFIGS]
+    if unknown:
+        raise ValueError(f"unknown models {', '.join(unknown)}, expected {', '.join(MODEL_CONFIGS)}")
+
+    tiers = {}
+    limits = {}  # model -> {tier name: --tier-inflight}
+    for name, model in models.items():
+        config = MODEL_CONFIGS[model]()
+        tiers[name] = ModelTier(name, config.llm.model, create_llm_instance(config.llm))
+        limits.setdefault(config.llm.model, {})
+        if name in inflight:
+            limits[config.llm.model][name] = inflight[name]
+
+    # tiers on the same model share its limiter, so they cannot have different limits
+    for model, tier_limits in limits.items():
+        if len(set(tier_limits.values())) > 1:
+            conflicting = ", ".join(f"{name}={value}" for name, value in tier_limits.items())
+            raise ValueError(f"tiers on {model} share one concurrency limit, got --tier-inflight {conflicting}")
+
+        # the limiter of a tier's model caps how many of its prompts are in flight
+        configure_model_limits(model, max_concurrency=next(iter(tier_limits.values()), max_inflight))
+
+    return ModelRouter(tiers)
+
+
+async def estimate_run(idea, file_extensions, max_file_size, graph_workers, graph_path, context_budget,
+                       max_inflight, requests_per_second, tokens_per_minute, investment, router=None):
+    """Scan, parse and chunk like a real run, then report the calls, tokens, cost and time it would take."""
+    splitter = SplitProject(config=no_model)
+    splitter.max_file_size = max_file_size
+    files = await splitter.run(idea, file_extensions)
+
+    graph_builder = BuildDependencyGraph(config=no_model)
+    if graph_workers:
+        graph_builder.workers = graph_workers
+    graph_builder.graph_path = graph_path
+    graph = await graph_builder.run(files, idea)
+
+    chunk_action = SummarizeChunks(config=c1)
+    file_action = FileSummarizer(config=c3)
+    chunk_action.context_budget = file_action.context_budget = context_budget
+    if router:
+        router.index_graph(graph["dependency_graph"])
+    estimator = RunEstimator(chunk_action, CombineChunkSummaries(config=c2), file_action, MODEL_PRICES, router)
+    estimate = estimator.estimate(graph["dependency_graph"], graph["processing_order"])
+
+    print(f"\n=== DRY RUN: {estimate['files']} files, {estimate['chunks']} chunks ===\n")
+    for name, totals in estimate["actions"].items():
+        average_context = totals["context_tokens"] / totals["calls"] if totals["calls"] else 0
+        print(
+            f"{name:<22} {totals['calls']:>8} calls {totals['prompt_tokens']:>12,} prompt tokens "
+            f"(~{average_context:.0f} dependency context per call) "
+            f"{totals['completion_tokens']:>10,} completion tokens  ${totals['cost']:.2f}"
+        )
+
+    total = estimate["total"]
+    seconds = project_time(estimate, max_inflight, requests_per_second, tokens_per_minute)
+    print(
+        f"\nTotal: {total['calls']} calls, {total['prompt_tokens'] + total['completion_tokens']:,} tokens, "
+        f"about ${total['cost']:.2f}, about {format_duration(seconds)} with {max_inflight} requests in flight"
+    )
+    if router:
+        print(f"Routed: {router.describe()}")
+    if total["cost"] > investment:
+        print(f"Warning: the estimate exceeds the ${investment:.2f} investment, a real run would stop early")
+
+    return estimate
+
 @app.command()
 async def main(
     idea: str = typer.Argument("../MetaGPT", help="Directory with source code to summarize."), #"test/java/jenkins",  # directory with source code, ex. "../metagpt"
-    investment: float = 5.0,
+    investment: float = 5.0, # dollars, the run stops sending prompts once this much is spent
     n_round: int = 5,
     pinecone_api_key: str = None,
     pinecone_index: str = typer.Option("metagpt", help="Name of Pinecone index to use."),
     file_extensions: str = typer.Option("py,java", "--file-extensions", "-f", help="File extensions to summarize."), # can add multiple
+    max_file_size: int = 1000000, # bytes, larger source files are skipped as generated or vendored
+    max_inflight: int = 1, # llm requests allowed in flight at once per model, 1 keeps the old serial behaviour
+    requests_per_second: float = None, # provider request rate limit per model, unlimited by default
+    tokens_per_minute: int = None, # provider token rate limit per model, unlimited by default
+    state_dir: str = None, # where run state such as the summary cache lives, defaults to <project>/.codestallation
+    cache: bool = True, # reuse summaries from earlier runs when code, dependencies, prompt and model are unchanged
+    since: str = None, # git revision, only files changed since then and their dependents are re-summarized
+    graph_workers: int = 0, # processes used to parse dependencies, 0 uses every core and 1 parses serially
+    rebuild_graph: bool = False, # ignore the saved dependency graph and parse every file again
+    vector_store: str = "pinecone", # "pinecone", or "local" for an embedded store under the state dir
+    upsert_batch_size: int = 96, # summaries embedded and upserted per vector store call
+    upsert_flush_seconds: float = 30.0, # longest a buffered summary waits before its batch is written
+    batch: str = None, # "external" writes prompts to JSONL batch files and waits for results, "local" answers them offline
+    batch_poll_seconds: float = 30.0, # how often external batch mode checks for a results file
+    context_budget: int = 2000, # tokens of dependency summaries allowed in each prompt
+    stream: bool = False, # summarize files while the project is still being scanned and parsed
+    stream_queue_size: int = 1000, # files buffered between two streaming stages
+    source_cache_mb: int = 256, # memory for source text and parse trees shared between stages
+    print_summaries: bool = True, # print every final summary once the run is done
+    dry_run: bool = False, # only count the calls, tokens, cost and time a run would take, no model is called
+    resume: bool = False, # continue a crashed or stopped run from its journal instead of starting over
+    route: str = None, # model per tier, e.g. "small=phi4,medium=haiku,large=gpt-4.1-mini", prompts go to a tier by size and file complexity
+    tier_inflight: str = None, # requests in flight per tier, e.g. "small=4,large=8", tiers default to --max-inflight
+    report: str = None, # JSON run report with time, tokens, retries and waits per stage and call, defaults to <state dir>/run_report.json
+    trace: str = None, # also write every span as a Chrome trace, open it in chrome://tracing or Perfetto
 ):
+    # CostTracker enforces the investment
     team = Team()
+    tracer = Tracer(keep_events=bool(trace))
+    set_tracer(tracer)
+    # every model call is priced, the run stops once investment dollars are spent
+    costs = CostTracker(MODEL_PRICES, budget=investment)
+    set_cost_tracker(costs)
     
+    set_max_inflight(max_inflight)
+    configure_rate_limits(requests_per_second=requests_per_second, tokens_per_minute=tokens_per_minute)
+
+    if since and not cache:
+        print("Error: --since needs the summary cache for the summaries of unchanged files.")
+        return
+
+    if stream and since:
+        print("Error: --stream always documents the whole project and cannot be combined with --since.")
+        return
+
+    state_dir = state_dir or os.path.join(idea, ".codestallation")
+    graph_path = os.path.join(state_dir, "dependency_graph.json.gz")
+    if rebuild_graph and os.path.exists(graph_path):
+        os.remove(graph_path)
+
+    set_source_store(SourceStore(max_bytes=source_cache_mb << 20))
+
+    router = None
+    if route:
+        try:
+            router = build_router(route, tier_inflight, max_inflight)
+        except ValueError as e:
+            print(f"Error: --route {e}.")
+            return
+        set_model_router(router)
+
+    if dry_run:
+        await estimate_run(
+            idea, file_extensions.split(","), max_file_size, graph_workers, graph_path, context_budget,
+            max_inflight, requests_per_second, tokens_per_minute, investment, router
+        )
+        return
+
+    # chunk summaries wait on disk between the roles instead of in message metadata
+    artifact_store = ArtifactStore(os.path.join(state_dir, "artifacts.sqlite"))
+    set_artifact_store(artifact_store)
+
+    summary_cache = SummaryCache(os.path.join(state_dir, "summaries.sqlite")) if cache else None
+    set_summary_cache(summary_cache)
+
+    # every summary is journaled as soon as it exists, --resume picks up from there
+    journal = RunJournal(os.path.join(state_dir, "journal.jsonl"), resume=resume)
+    set_run_journal(journal)
+    if resume:
+        print(f"Resuming from journal: {journal.describe()}")
+
+    if batch:
+        processor = LocalBatchProcessor() if batch == "local" else ExternalBatchProcessor(batch_poll_seconds)
+        set_batch_broker(BatchBroker(os.path.join(state_dir, "batches"), processor))
+        # a batch should hold every prompt of a dependency level, not max_inflight of them
+        set_max_inflight(max(max_inflight, 100000))
+
+    if vector_store == "local":
+        store = LocalVectorStore(os.path.join(state_dir, "vectors"))
+    else:
+        store = PineconeVectorStore(api_key=pinecone_api_key or os.getenv("PINECONE_API_KEY"))
     
     file_extensions = file_extensions.split(",")
-    project_splitter = ProjectSplitter(config=no_model, file_extensions=file_extensions)
-    dependency_builder = DependencyGraphBuilder(config=no_model)
-    chunk_summarizer = ChunkSummarizer(config=c1)
-    chunk_combiner = ChunkSummaryCombiner(config=c2)
-    file_summarizer = FileLevelSummarizer(config=c3, pinecone_index=pinecone_index)
-    
-    team.hire([
-        project_splitter,
-        dependency_builder,
-        chunk_summarizer, 
-        chunk_combiner,
-        file_summarizer
-    ])
-    
-    team.run_project(idea, send_to="ProjectSplitter")
+    if stream:
+        # one role runs every stage, files flow between them through bounded queues
+        file_summarizer = StreamingSummarizer(
+            config=c1,
+            combine_config=c2,
+            final_config=c3,
+            file_extensions=file_extensions,
+            max_file_size=max_file_size,
+            queue_size=stream_queue_size,
+            workers=max_inflight,
+            graph_path=graph_path,
+            pinecone_index=pinecone_index,
+            vector_store=store,
+            upsert_batch_size=upsert_batch_size,
+            upsert_flush_interval=upsert_flush_seconds,
+            context_budget=context_budget
+        )
+        team.hire([file_summarizer])
+        team.run_project(idea, send_to="StreamingSummarizer")
+    else:
+        project_splitter = ProjectSplitter(
+            config=no_model, file_extensions=file_extensions, max_file_size=max_file_size
+        )
+        dependency_builder = DependencyGraphBuilder(
+            config=no_model, since=since, graph_workers=graph_workers, graph_path=graph_path
+        )
+        chunk_summarizer = ChunkSummarizer(config=c1, context_budget=context_budget)
+        chunk_combiner = ChunkSummaryCombiner(config=c2)
+        file_summarizer = FileLevelSummarizer(
+            config=c3,
+            pinecone_index=pinecone_index,
+            vector_store=store,
+            upsert_batch_size=upsert_batch_size,
+            upsert_flush_interval=upsert_flush_seconds,
+            context_budget=context_budget
+        )
+        
+        team.hire([
+            project_splitter,
+            dependency_builder,
+            chunk_summarizer, 
+            chunk_combiner,
+            file_summarizer
+        ])
+        
+        team.run_project(idea, send_to="ProjectSplitter")
     
     # run the team for the specified number of rounds
-    await team.run(n_round=n_round)
+    try:
+        await team.run(n_round=n_round)
+    except Exception as e:
+        # roles re-raise failures as plain exceptions, the tracker knows whether the budget ran out.
+        # metagpt still checks its own default budget between rounds, that stops the run the same way
+        if not costs.exceeded and not isinstance(e, NoMoneyException):
+            raise
+        print(f"Stopping: the ${investment:.2f} investment is spent, continue later with --resume")
+    finally:
+        journal.close()
+    store.close()
+    artifact_store.close()
+
+    rate_limits = {}
+    for model, limiter in all_rate_limiters().items():
+        stats = rate_limits[model] = limiter.stats()
+        print(
+            f"Rate limiter for {model}: {stats['requests']} requests, {stats['overloads']} overloads, "
+            f"concurrency limit {stats['concurrency_limit']}/{stats['max_concurrency']}, "
+            f"{stats['wait_seconds']:.1f}s spent waiting"
+        )
+
+    source_stats = stats = get_source_store().stats()
+    print(
+        f"Source store: {stats['reads']} file reads, {stats['hits']} reuses ({stats['hit_rate']:.0%}), "
+        f"{stats['evictions']} evictions"
+    )
+
+    print(f"Model spend: ${costs.spent:.2f} of ${investment:.2f} over {costs.calls} calls")
+    if router:
+        print(f"Model routing: {router.describe()}")
+
+    cache_stats = None
+    if summary_cache:
+        cache_stats = stats = summary_cache.stats()
+        print(f"Summary cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+        summary_cache.close()
+
+    report = report or os.path.join(state_dir, "run_report.json")
+    tracer.write_report(
+        report,
+        files=len(file_summarizer.final_summaries),
+        rate_limiters=rate_limits,
+        source_store=source_stats,
+        summary_cache=cache_stats,
+        cost=costs.stats()
+    )
+    print(f"Run report written to {report}")
+    if trace:
+        tracer.write_chrome_trace(trace)
+        print(f"Trace written to {trace}")
     
     # print final summaries
-    if hasattr(file_summarizer, 'final_summaries') and file_summarizer.final_summaries:
+    if print_summaries and file_summarizer.final_summaries:
         print("\n=== DOCUMENTATION COMPLETE ===\n")
         for file, summary in file_summarizer.final_summaries.items():
             print(f"\n--- {file} ---\n")
@@ -4,6 +4,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# dollars per million input and output tokens, used for --investment and --dry-run
+MODEL_PRICES = {
+    "claude-3-5-haiku-20241022": {"input": 0.80, "output": 4.00},
+    "gpt-4.1-mini-2025-04-14": {"input": 0.40, "output": 1.60},
+    "gpt-4o-mini-2024-07-18": {"input": 0.15, "output": 0.60},
+    # self-hosted, no charge per token
+    "TinyLlama/TinyLlama-1.1B-Chat-v1.0": {"input": 0.0, "output": 0.0},
+    "microsoft/Phi-4-mini-instruct": {"input": 0.0, "output": 0.0},
+    "no_model": {"input": 0.0, "output": 0.0},
+}
+
 # for quantized models, simply host on huggingface
 
 def get_tinyllama():
@@ -31,11 +42,23 @@ def get_chatgpt():
     llm_config = {
         "api_type": "openai",
         "base_url": "https://api.openai.com/v1",
-        "api_key": "",
+        "api_key": os.getenv("OPENAI_API_KEY"),
         "model": "gpt-4.1-mini-2025-04-14"# "gpt-4o-mini-2024-07-18" 2048 max input tokens ??
     }
 
+    gpt = Config.from_llm_config(llm_config)
+    return gpt
+
 def get_no_model():
     config = {"api_type": "codestallation", "model": "no_model"}
     no_model = Config.from_llm_config(config)
     return no_model
+
+
+# names accepted by --route, e.g. --route=small=phi4,medium=haiku,large=gpt-4.1-mini
+MODEL_CONFIGS = {
+    "tinyllama": get_tinyllama,
+    "phi4": get_phi4,
+    "haiku": get_claude,
+    "gpt-4.1-mini": get_chatgpt,
+}
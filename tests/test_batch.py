@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from lib.batch import BatchBroker, LocalBatchProcessor
+
+
+class FakeBatchClient:
+    """Answers every prompt with its reverse, or never answers while `hang` is set."""
+
+    def __init__(self, hang=False):
+        self.hang = hang
+        self.processed = []
+        self.local = LocalBatchProcessor(lambda model, prompt: f"{model}:{prompt[::-1]}")
+
+    async def process(self, requests_path):
+        self.processed.append(requests_path)
+        if self.hang:
+            await asyncio.Event().wait()
+        return await self.local.process(requests_path)
+
+
+def test_submitted_prompts_are_answered_in_one_batch(tmp_path):
+    async def run():
+        client = FakeBatchClient()
+        broker = BatchBroker(str(tmp_path), client, linger=0.01)
+
+        responses = await asyncio.gather(broker.submit("m", "abc"), broker.submit("m", "xyz"))
+
+        assert responses == ["m:cba", "m:zyx"]
+        assert len(client.processed) == 1
+        assert broker.batches == 1 and broker.requests == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_flush_does_not_leave_callers_waiting(tmp_path):
+    async def run():
+        broker = BatchBroker(str(tmp_path), FakeBatchClient(hang=True), linger=0.01)
+
+        submitted = asyncio.ensure_future(broker.submit("m", "abc"))
+        await asyncio.sleep(0.05)  # the batch is written and waits on the client
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task() and task is not submitted:
+                task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(submitted, timeout=1)
+
+    asyncio.run(run())
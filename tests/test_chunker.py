@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from tree_sitter_languages import get_parser
+
+from lib.chunker import SyntaxChunker
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def chunker(max_tokens, overlap_tokens=0):
+    return SyntaxChunker(get_parser("python"), count_words, max_tokens, overlap_tokens)
+
+
+@pytest.mark.parametrize("path", ["actions.py", "agents.py", os.path.join("lib", "vector_store.py")])
+@pytest.mark.parametrize("max_tokens", [50, 300, 2000])
+def test_chunks_cover_every_line_within_the_budget(path, max_tokens):
+    with open(os.path.join(ROOT, path), encoding="utf8") as f:
+        content = f.read()
+    lines = content.split("\n")
+
+    covered = set()
+    previous_end = 0
+    for start, end, text in chunker(max_tokens, overlap_tokens=10).chunk(content):
+        # chunks carry the real lines they report, without gaps between them
+        assert text == "\n".join(lines[start - 1:end])
+        assert start <= previous_end + 1
+        previous_end = max(previous_end, end)
+        covered.update(range(start, end + 1))
+
+        # only a single line can be too large to split
+        assert count_words(text) <= max_tokens or start == end
+
+    assert covered == set(range(1, len(lines) + 1))
+
+
+def test_small_declarations_are_packed_together():
+    content = "\n\n".join(f"def f{i}():\n    return {i}\n" for i in range(6))
+
+    assert [(start, end) for start, end, _ in chunker(1000).chunk(content)] == [(1, 23)]
+    # four words per function, two of them fit, blank lines go with the function after them
+    assert [(start, end) for start, end, _ in chunker(8).chunk(content)] == [(1, 6), (7, 14), (15, 23)]
+
+
+def test_oversized_class_is_split_along_its_methods():
+    methods = "".join(f"    def m{i}(self):\n        return {i} + {i} + {i}\n\n" for i in range(4))
+    content = "class Large:\n" + methods
+
+    chunks = chunker(20).chunk(content)
+
+    # seven words per method, the class header rides along with the first chunk
+    assert [(start, end) for start, end, _ in chunks] == [(1, 6), (7, 14)]
+    assert chunks[0][2].startswith("class Large:\n    def m0(self):")
+    assert all(text.lstrip().startswith(("class", "def")) for _, _, text in chunks)
+
+
+def test_unsplittable_nodes_fall_back_to_overlapping_line_windows():
+    content = 'x = """\n' + "\n".join("word " * 5 for _ in range(40)) + '\n"""\n'
+
+    chunks = chunker(30, overlap_tokens=10).chunk(content)
+    windows = [(start, end) for start, end, _ in chunks]
+
+    assert windows[0] == (1, 6)
+    assert all(count_words(text) <= 30 for _, _, text in chunks)
+    # consecutive windows share the two trailing lines that fit in the overlap
+    for (_, previous_end), (start, _) in zip(windows[:-2], windows[1:-1]):
+        assert start == previous_end - 1
+    assert windows[-1][1] == len(content.split("\n"))
@@ -0,0 +1,43 @@
+import os
+
+from lib.graph_store import file_record, load_graph, save_graph
+from lib.incremental import stale_files
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf8")
+    return str(path)
+
+
+def test_importers_of_a_deleted_dependency_are_stale(tmp_path):
+    helper = write(tmp_path / "helper.py", "def help(): pass\n")
+    service = write(tmp_path / "service.py", "import helper\n")
+    app = write(tmp_path / "app.py", "import service\n")
+    other = write(tmp_path / "other.py", "x = 1\n")
+
+    graph_path = str(tmp_path / "graph.json.gz")
+    previous = {helper: [], service: [helper], app: [service], other: []}
+    save_graph(graph_path, str(tmp_path), previous, {file: file_record(file) for file in previous})
+    saved_graph, _ = load_graph(graph_path, str(tmp_path))
+
+    os.remove(helper)
+    current = {service: [], app: [service], other: []}
+
+    stale = stale_files(current, {os.path.realpath(helper)}, saved_graph)
+    assert stale == {service, app}
+
+    # without the saved graph nothing points at the deleted file any more
+    assert stale_files(current, {os.path.realpath(helper)}) == set()
+
+
+def test_files_whose_dependencies_changed_are_stale(tmp_path):
+    base = write(tmp_path / "base.py", "x = 1\n")
+    util = write(tmp_path / "util.py", "y = 2\n")
+    user = write(tmp_path / "user.py", "import util\n")
+    app = write(tmp_path / "app.py", "import user\n")
+
+    previous = {base: [], util: [], user: [base], app: [user]}
+    current = {base: [], util: [], user: [util], app: [user]}
+
+    assert stale_files(current, set(), previous) == {user, app}
+    assert stale_files(previous, set(), previous) == set()
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+
+from lib.journal import RunJournal
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf8")
+    return str(path)
+
+
+def journal_with(path, files):
+    journal = RunJournal(path)
+
+    async def record():
+        for file in files:
+            await journal.record_chunks(file, [{"content": "code", "start_line": 1, "end_line": 1, "summary": "s"}])
+            await journal.record_summary("final", file, f"summary of {os.path.basename(file)}")
+        await journal.record_indexed(files)
+
+    asyncio.run(record())
+    journal.close()
+
+
+def test_resume_drops_a_torn_last_record(tmp_path):
+    source = write(tmp_path / "a.py", "x = 1\n")
+    path = str(tmp_path / "journal.jsonl")
+    journal_with(path, [source])
+    valid_bytes = os.path.getsize(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"stage": "final", "file": "b.py", "summ')
+
+    journal = RunJournal(path, resume=True)
+    assert journal.get("final", source) == "summary of a.py"
+    assert journal.get("chunks", source) == [{"start_line": 1, "end_line": 1, "summary": "s"}]
+    assert journal.indexed == {source}
+    assert os.path.getsize(path) == valid_bytes
+
+    # new records start on a line of their own
+    asyncio.run(journal.record_summary("combined", source, "combined"))
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["stage"] for line in f] == ["chunks", "final", "indexed", "combined"]
+
+
+def test_a_run_without_resume_starts_a_new_journal(tmp_path):
+    source = write(tmp_path / "a.py", "x = 1\n")
+    path = str(tmp_path / "journal.jsonl")
+    journal_with(path, [source])
+
+    journal = RunJournal(path)
+    assert journal.get("final", source) is None
+    journal.close()
+    assert os.path.getsize(path) == 0
+
+
+def test_edited_files_and_their_dependents_are_discarded_for_good(tmp_path):
+    util = write(tmp_path / "util.py", "x = 1\n")
+    service = write(tmp_path / "service.py", "import util\n")
+    app = write(tmp_path / "app.py", "import service\n")
+    other = write(tmp_path / "other.py", "y = 2\n")
+    path = str(tmp_path / "journal.jsonl")
+    journal_with(path, [util, service, app, other])
+
+    write(tmp_path / "util.py", "x = 2\n")
+    journal = RunJournal(path, resume=True)
+    assert journal.changed == {util}
+    assert journal.get("final", util) is None
+
+    graph = {util: [], service: [util], app: [service], other: []}
+    journal.invalidate(graph)
+    assert journal.get("final", service) is None and journal.get("final", app) is None
+    assert journal.get("final", other) == "summary of other.py"
+    assert journal.indexed == {other}
+    journal.close()
+
+    # the util edit is journaled now, a later resume must not revive its dependents
+    journal = RunJournal(path, resume=True)
+    assert journal.get("final", app) is None
+    assert journal.get("final", other) == "summary of other.py"
+    journal.close()
+
+
+def test_invalidate_uses_the_saved_graph_for_deleted_dependencies(tmp_path):
+    util = write(tmp_path / "util.py", "x = 1\n")
+    service = write(tmp_path / "service.py", "import util\n")
+    other = write(tmp_path / "other.py", "y = 2\n")
+    path = str(tmp_path / "journal.jsonl")
+    journal_with(path, [util, service, other])
+
+    os.remove(util)
+    journal = RunJournal(path, resume=True)
+    assert journal.changed == {util}
+
+    # util is gone from the current graph, only the saved one knows service imported it
+    previous_graph = {util: [], service: [util], other: []}
+    journal.invalidate({service: [], other: []}, previous_graph)
+    assert journal.get("final", service) is None
+    assert journal.get("final", other) == "summary of other.py"
+    journal.close()
@@ -0,0 +1,26 @@
+import asyncio
+
+from lib.rate_limiter import AdaptiveRateLimiter, is_overload_error, is_transport_error
+
+
+def test_overloads_and_transport_errors_are_told_apart():
+    assert is_overload_error(Exception("Error code: 529 {'type': 'overloaded_error'}"))
+    assert is_overload_error(Exception("Error code: 429 {'type': 'rate_limit_error'}"))
+    assert not is_overload_error(Exception("httpx.RemoteProtocolError: peer closed connection"))
+    assert is_transport_error(Exception("httpx.RemoteProtocolError: peer closed connection"))
+    assert not is_transport_error(Exception("invalid api key"))
+
+
+def test_only_overloads_shrink_the_concurrency_limit():
+    async def run():
+        limiter = AdaptiveRateLimiter(max_concurrency=8, base_cooldown=0.0)
+
+        await limiter.acquire()
+        limiter.release(failed=True)
+        assert limiter.limit == 8
+
+        await limiter.acquire()
+        limiter.release(overloaded=True)
+        assert limiter.limit == 4
+
+    asyncio.run(run())
@@ -0,0 +1,110 @@
+import os
+
+from lib.scanner import GitignoreRules, ProjectScanner
+
+
+def write(path, data=b"x = 1\n"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_comments_and_blank_lines_are_ignored():
+    rules = GitignoreRules(["# a comment\n", "\n", "   \n"])
+    assert rules.rules == []
+    assert rules.match("a.py", False) is None
+
+
+def test_unanchored_patterns_match_at_any_depth():
+    rules = GitignoreRules(["*.log\n", "secret.py\n"])
+    assert rules.match("debug.log", False)
+    assert rules.match("deep/down/debug.log", False)
+    assert rules.match("pkg/secret.py", False)
+    assert rules.match("secret.pyc", False) is None
+
+
+def test_slashes_anchor_a_pattern_to_its_directory():
+    rules = GitignoreRules(["/config.py\n", "docs/build\n"])
+    assert rules.match("config.py", False)
+    assert rules.match("pkg/config.py", False) is None
+    assert rules.match("docs/build", True)
+    assert rules.match("src/docs/build", True) is None
+
+
+def test_directory_only_patterns_skip_files():
+    rules = GitignoreRules(["cache/\n"])
+    assert rules.match("cache", True)
+    assert rules.match("pkg/cache", True)
+    assert rules.match("cache", False) is None
+
+
+def test_negation_re_includes_and_the_last_match_wins():
+    rules = GitignoreRules(["*.py\n", "!keep.py\n"])
+    assert rules.match("drop.py", False)
+    assert rules.match("keep.py", False) is False
+    assert GitignoreRules(["!keep.py\n", "*.py\n"]).match("keep.py", False)
+
+
+def test_wildcards():
+    rules = GitignoreRules(["file?.txt\n", "data[0-9].csv\n", "tmp[!a].py\n", "a/*/c.py\n"])
+    assert rules.match("file1.txt", False)
+    assert rules.match("file10.txt", False) is None
+    assert rules.match("data7.csv", False)
+    assert rules.match("datax.csv", False) is None
+    assert rules.match("tmpb.py", False)
+    assert rules.match("tmpa.py", False) is None
+    assert rules.match("a/b/c.py", False)
+    # a single star does not cross directories
+    assert rules.match("a/b/d/c.py", False) is None
+
+
+def test_double_star():
+    rules = GitignoreRules(["**/generated\n", "logs/**\n", "a/**/z.py\n", "\\#literal.py\n"])
+    assert rules.match("generated", True)
+    assert rules.match("x/y/generated", True)
+    assert rules.match("logs/2024/01.log", False)
+    assert rules.match("a/z.py", False)
+    assert rules.match("a/b/c/z.py", False)
+    assert rules.match("#literal.py", False)
+
+
+def test_scanner_applies_nested_gitignores_and_prunes_directories(tmp_path):
+    write(tmp_path / ".gitignore", b"ignored/\n*.tmp.py\n")
+    keep = write(tmp_path / "src" / "keep.py")
+    write(tmp_path / "src" / "scratch.tmp.py")
+    write(tmp_path / "ignored" / "a.py")
+    write(tmp_path / "node_modules" / "b.py")
+    write(tmp_path / "src" / "notes.txt")
+    # the closer .gitignore overrides the root one
+    write(tmp_path / "vendor" / ".gitignore", b"*.py\n!wanted.py\n")
+    wanted = write(tmp_path / "vendor" / "wanted.py")
+    write(tmp_path / "vendor" / "other.py")
+
+    scanner = ProjectScanner(str(tmp_path), ["py"])
+    assert scanner.collect() == [keep, wanted]
+    assert scanner.stats["pruned_directories"] == 2
+    assert scanner.stats["gitignored"] == 2
+
+    assert len(ProjectScanner(str(tmp_path), ["py"], use_gitignore=False).collect()) == 5
+
+
+def test_scanner_skips_large_generated_and_binary_files(tmp_path):
+    source = write(tmp_path / "source.py")
+    write(tmp_path / "large.py", b"x = 1\n" * 100)
+    write(tmp_path / "message_pb2.py")
+    write(tmp_path / "schema.py", b"# Code generated by protoc. DO NOT EDIT.\nx = 1\n")
+    write(tmp_path / "blob.py", b"x = 1\n\0\0\0")
+
+    scanner = ProjectScanner(str(tmp_path), [".PY"], max_file_size=100)
+    assert scanner.collect() == [source]
+    assert {reason: scanner.stats[reason] for reason in ("large", "generated", "binary")} == {
+        "large": 1, "generated": 2, "binary": 1
+    }
+    assert "to summarize" in scanner.describe()
+
+
+def test_symlinked_directories_are_not_followed(tmp_path):
+    source = write(tmp_path / "pkg" / "a.py")
+    os.symlink(tmp_path / "pkg", tmp_path / "link")
+
+    assert ProjectScanner(str(tmp_path), ["py"]).collect() == [source]
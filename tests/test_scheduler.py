@@ -0,0 +1,138 @@
+import asyncio
+
+from lib.scheduler import DependencyScheduler, StreamingScheduler, depth_first_order
+
+
+def run(coroutine):
+    # a scheduler that hangs fails the test instead of the whole run
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+
+def test_levels_follow_the_dependencies():
+    graph = {"app": ["service", "util"], "service": ["model"], "model": [], "util": [], "cli": ["util"]}
+    scheduler = DependencyScheduler(graph, depth_first_order(graph))
+
+    assert [sorted(level) for level in scheduler.levels()] == [["model", "util"], ["cli", "service"], ["app"]]
+    assert scheduler.describe()["critical_path_length"] == 3
+    assert scheduler.describe()["max_width"] == 2
+
+
+def test_run_starts_files_after_their_dependencies_within_the_bound():
+    graph = {f"leaf{i}": [] for i in range(20)}
+    graph["root"] = list(graph)
+    scheduler = DependencyScheduler(graph, depth_first_order(graph))
+
+    finished = []
+    in_flight = 0
+    most_in_flight = 0
+
+    async def worker(file):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        finished.append(file)
+
+    run(scheduler.run(worker, max_concurrency=3))
+
+    assert most_in_flight == 3
+    assert len(finished) == 21 and finished[-1] == "root"
+
+
+def test_cycles_do_not_hang():
+    graph = {"a": ["b"], "b": ["c"], "c": ["a"], "d": ["a"]}
+    order = depth_first_order(graph)
+    scheduler = DependencyScheduler(graph, order)
+
+    finished = []
+
+    async def worker(file):
+        finished.append(file)
+
+    run(scheduler.run(worker, max_concurrency=4))
+
+    # one edge of the cycle is ignored, the rest still holds
+    assert sorted(finished) == ["a", "b", "c", "d"]
+    assert finished.index("a") < finished.index("d")
+    assert sum(len(level) for level in scheduler.levels()) == 4
+
+
+async def drain(scheduler):
+    """Hand out and finish files one at a time until the scheduler is done."""
+    order = []
+    while (file := await scheduler.next()) is not None:
+        order.append(file)
+        await scheduler.done(file)
+    return order
+
+
+def test_streaming_waits_for_a_dependency_that_arrives_later():
+    async def scenario():
+        scheduler = StreamingScheduler()
+        await scheduler.add("app", ["util"])
+        assert scheduler._ready.empty()
+
+        await scheduler.add("util", [])
+        assert await scheduler.next() == "util"
+        await scheduler.done("util")
+        assert await scheduler.next() == "app"
+        await scheduler.done("app")
+
+        await scheduler.close()
+        assert await scheduler.next() is None
+
+    run(scenario())
+
+
+def test_streaming_breaks_cycles_and_drops_missing_dependencies_on_close():
+    async def scenario():
+        scheduler = StreamingScheduler()
+        await scheduler.add("a", ["b"])
+        await scheduler.add("b", ["a"])
+        await scheduler.add("c", ["a", "never_added"])
+        assert scheduler._ready.empty()
+
+        close = asyncio.ensure_future(scheduler.close())
+        order = await drain(scheduler)
+        await close
+
+        assert sorted(order) == ["a", "b", "c"]
+        assert order.index("a") < order.index("c")
+
+    run(scenario())
+
+
+def test_streaming_add_blocks_while_the_queue_is_full():
+    async def scenario():
+        scheduler = StreamingScheduler(capacity=2)
+        await scheduler.add("a", [])
+        await scheduler.add("b", [])
+
+        blocked = asyncio.ensure_future(scheduler.add("c", []))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        # handing a file to a worker makes room
+        assert await scheduler.next() == "a"
+        await asyncio.wait_for(blocked, timeout=1)
+        assert scheduler.max_pending == 2
+
+        await scheduler.done("a")
+        await scheduler.close()
+        assert await drain(scheduler) == ["b", "c"]
+
+    run(scenario())
+
+
+def test_streaming_add_lets_files_in_when_nothing_can_run():
+    async def scenario():
+        scheduler = StreamingScheduler(capacity=1)
+        await scheduler.add("app", ["util"])
+        # the queue is full, but app cannot run until util is known
+        await asyncio.wait_for(scheduler.add("util", []), timeout=1)
+
+        await scheduler.close()
+        assert await drain(scheduler) == ["util", "app"]
+
+    run(scenario())
@@ -0,0 +1,77 @@
+from lib.dependency_parser import get_dependency_parser
+from lib.outline import get_outline
+from lib.source_store import SourceStore, set_source_store
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf8")
+    return str(path)
+
+
+def test_small_files_are_read_into_memory(tmp_path):
+    store = SourceStore()
+    path = write(tmp_path / "small.py", "x = 1\n")
+
+    assert store.text(path) == "x = 1\n"
+    assert not store.get(path).mapped
+    assert store.stats()["reads"] == 1
+    assert store.stats()["hits"] == 1
+
+
+def test_large_files_are_memory_mapped(tmp_path):
+    store = SourceStore()
+    body = "def f{0}():\n    return {0}\n\n"
+    text = "".join(body.format(i) for i in range(SourceStore.MMAP_THRESHOLD // len(body.format(0)) + 10))
+    path = write(tmp_path / "large.py", text)
+
+    source = store.get(path)
+    assert source.mapped
+    assert store.text(path) == text
+
+    parser = get_dependency_parser().syntax_parser(path)
+    tree = store.tree(path, parser)
+    assert tree.root_node.end_byte == len(text.encode("utf8"))
+    assert not tree.root_node.has_error
+
+
+def test_dependencies_and_outlines_of_mapped_files(tmp_path):
+    set_source_store(SourceStore())
+    parser = get_dependency_parser()
+
+    helper = write(tmp_path / "helper.py", "x = 1\n")
+    body = "def f{0}():\n    \"\"\"Returns {0}.\"\"\"\n    return {0}\n\n"
+    count = SourceStore.MMAP_THRESHOLD // len(body.format(0)) + 10
+    large = write(tmp_path / "main.py", "import helper\n\n" + "".join(body.format(i) for i in range(count)))
+
+    assert parser.find_dependencies(large, str(tmp_path)) == [helper]
+    outline = get_outline(large)
+    assert len(outline) == count
+    assert outline[0]["signature"] == "def f0():" and outline[0]["docstring"] == "Returns 0."
+
+    package = tmp_path / "com" / "example"
+    package.mkdir(parents=True)
+    java_helper = write(package / "Helper.java", "package com.example;\n\nclass Helper {}\n")
+    method = "    /** Returns {0}. */\n    int m{0}() {{ return {0}; }}\n"
+    count = SourceStore.MMAP_THRESHOLD // len(method.format(0)) + 10
+    java_large = write(
+        package / "Large.java",
+        "package com.example;\n\nimport com.example.Helper;\n\nclass Large {\n"
+        + "".join(method.format(i) for i in range(count)) + "}\n"
+    )
+
+    assert set(parser.find_dependencies(java_large, str(tmp_path))) == {java_helper}
+    outline = get_outline(java_large)
+    assert len(outline) == count + 1
+    assert outline[1]["signature"] == "int m0()" and outline[1]["docstring"] == "Returns 0."
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    store = SourceStore(max_bytes=100)
+    first = write(tmp_path / "first.py", "a" * 60)
+    second = write(tmp_path / "second.py", "b" * 60)
+
+    store.get(first)
+    store.get(second)
+
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["files"] == 1
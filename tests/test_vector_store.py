@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from lib.vector_store import BufferedUpserter, LocalVectorStore
+
+
+def test_local_store_records_survive_reopening(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dimension=4)
+    store.upsert([{"id": "a", "values": [1, 0, 0, 0], "metadata": {"text": "old"}}], "ns")
+    store.upsert([{"id": "b", "values": [0, 1, 0, 0]}], "ns")
+    store.upsert([{"id": "a", "values": [1, 0, 0, 0], "metadata": {"text": "new"}}], "ns")
+    store.close()
+
+    store = LocalVectorStore(str(tmp_path), dimension=4)
+    assert store.query([1, 0, 0, 0], top_k=1, namespace="ns") == [
+        {"id": "a", "score": 1.0, "metadata": {"text": "new"}}
+    ]
+    assert len(store.query([0, 1, 0, 0], namespace="ns")) == 2
+    store.close()
+
+
+class FailingStore:
+    def embed(self, texts, input_type="passage"):
+        raise RuntimeError("vector store down")
+
+
+def test_failed_timed_flush_is_raised_from_the_next_flush():
+    async def run():
+        upserter = BufferedUpserter(FailingStore(), "ns", flush_interval=0.01, max_retries=1)
+        await upserter.add("a", "summary")
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(RuntimeError, match="vector store down"):
+            await upserter.flush()
+        await upserter.flush()
+
+    asyncio.run(run())